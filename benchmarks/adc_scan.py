@@ -0,0 +1,43 @@
+# Power housekeeping ADC reads, checks scan_adc matches the seven single channel readers and prints both read rates
+# for reference. scan_adc is a convenience, it makes the same transfers, so the rates should be about equal
+# Run from the repository root: python -m benchmarks.adc_scan
+# On the Pi, --hardware reads the real MCP3208, otherwise the simulated one answers every transfer after --latency seconds
+
+import argparse
+import time
+from drivers import backend, gpio
+
+SINGLE = (gpio.solar_i_1, gpio.solar_v_1, gpio.solar_i_2, gpio.solar_v_2, gpio.battery_v, gpio.battery_i, gpio.payload_i)
+
+
+def rate(fn, duration):
+    """
+    :return: (float) calls per second over duration seconds
+    """
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < duration:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark power channel ADC reads")
+    parser.add_argument("--hardware", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated SPI transfer")
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+    if not args.hardware:  # noiseless and constant, so both ways of reading must agree exactly
+        backend.select(backend.SIM, spi_latency=args.latency, adc_noise=0, waveforms={c: 0.1 + 0.35 * c for c in range(8)})
+    gpio.start()
+    single = [f() for f in SINGLE]
+    scanned = gpio.scan_adc().tolist()
+    assert all(abs(a - b) < 1e-9 * max(1, abs(a)) for a, b in zip(single, scanned)), (single, scanned)
+    channels = len(gpio.POWER_CHANNELS)
+    for name, fn in (("single", lambda: [f() for f in SINGLE]), ("scan_adc", gpio.scan_adc)):
+        frames = rate(fn, args.duration)
+        print(f"{name:<9} {frames:10.0f} frames/s  {frames * channels:10.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# 3 byte float codec throughput, scalar reference vs the NumPy batch codec
+# Run from the repository root: python -m benchmarks.codec_throughput
+
+import argparse
+import random
+import time
+import codec
+
+PACKET_VALUES = 98  # (MAX_PACKET_SIZE - HEADER_SIZE) // FLOAT_LEN
+
+
+def _rate(fn, values, repeat):
+    """
+    :return: (float) values per second, best of repeat
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(values)
+        best = min(best, time.perf_counter() - start)
+    return len(values) / best
+
+
+def run(count, repeat=5, seed=0):
+    """
+    :param count: (int) values per call, PACKET_VALUES for one full packet
+    :return: (dict) values per second for each codec, and whether the batch output matched the scalar output
+    """
+    rng = random.Random(seed)
+    values = [rng.choice((-1, 1)) * 10 ** rng.uniform(-6, 6) for _ in range(count)]
+    scalar_encode = lambda v: b"".join(codec.encode_float(n).to_bytes(3, "big") for n in v)
+    encoded = codec.encode_floats(values)
+    scalar_decode = lambda d: [codec.decode_float(int.from_bytes(d[i:i + 3], "big")) for i in range(0, len(d), 3)]
+    exact = scalar_encode(values) == encoded and scalar_decode(encoded) == codec.decode_floats(encoded).tolist()
+    return {"values": count, "bit_exact": exact,
+            "scalar_encode": _rate(scalar_encode, values, repeat), "batch_encode": _rate(codec.encode_floats, values, repeat),
+            "scalar_decode": _rate(scalar_decode, encoded, repeat) / 3, "batch_decode": _rate(codec.decode_floats, encoded, repeat) / 3}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the 3 byte float codec")
+    parser.add_argument("--count", type=int, action="append", help="values per call, repeatable")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for count in args.count or [PACKET_VALUES, 100000]:
+        result = run(count, args.repeat)
+        print(f"{result['values']} values, bit exact: {result['bit_exact']}")
+        for name in ("scalar_encode", "batch_encode", "scalar_decode", "batch_decode"):
+            print(f"  {name:<14} {result[name]:14,.0f} values/s")
+
+
+if __name__ == "__main__":
+    main()
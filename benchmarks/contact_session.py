@@ -0,0 +1,73 @@
+# End to end contact session benchmark against the pty modem simulator
+# Run from the repository root: python -m benchmarks.contact_session --profile realistic --scale 0.1
+
+import argparse
+import time
+import comms
+import ground
+from scheduler import RetryScheduler
+from drivers import backend, gpio
+from drivers.iridium import Iridium
+from sim.iridium import IridiumSimulator, PROFILES
+
+
+def run(profile, packets=10, mt=2, scale=1.0, seed=0, limit=120):
+    """
+    Runs comms.contact() until both queues are drained or the time limit runs out
+    :param profile: (str) simulator profile
+    :param packets: (int) packets queued before contact
+    :param mt: (int) MT messages waiting at the GSS
+    :param scale: (float) multiplier on every simulated latency, to keep slow profiles short
+    :param limit: (float) seconds before giving up on draining the queue
+    :return: (dict) timing and session counts
+    """
+    settings = dict(PROFILES[profile])
+    for key in ("latency", "sbdix_latency", "csq_latency"): settings[key] *= scale
+    settings["dropouts"] = [(start * scale, duration * scale) for start, duration in settings["dropouts"]]
+    sim = IridiumSimulator(mt_queue=[bytes([0])] * mt, seed=seed, **settings)
+    with sim:
+        comms.iridium = Iridium(port=sim.port, baudrate=19200)
+        sim.wire(backend.gpio(), gpio.NET_AVAIL, gpio.RING_INDICATOR)  # NET_AVAIL follows simulated signal
+        comms.transmission_queue.clear()
+        comms.received_queue = []
+        comms.load_latencies.clear()
+        comms.mt_queued, comms.session_stats = None, dict.fromkeys(comms.session_stats, 0)
+        comms.scheduler = RetryScheduler(base_delay=20 * scale, max_delay=900 * scale, hardware_delay=1800 * scale,
+                                         orbit_period=5560 * scale, csq_interval=40 * scale)
+        for i in range(packets):
+            packet = comms.Packet("filler", return_data=[float(i + j) for j in range(20)])
+            packet.set_time()
+            comms.append_to_queue(packet)
+        start, contacts = time.perf_counter(), 0
+        while (len(comms.transmission_queue) or sim.mt_queue) and time.perf_counter() - start < limit:
+            if not gpio.read_network_available() or comms.next_contact_in() > 0:
+                time.sleep(0.05)
+                continue
+            try: comms.contact()
+            except ValueError: pass
+            contacts += 1
+        elapsed = time.perf_counter() - start
+        comms.iridium.serial.close()
+        delivered = sum(len(ground.unpack_frame(message)) for message in sim.delivered)
+    loads = sorted(comms.load_latencies) or [0.0]
+    return {"profile": profile, "seconds": elapsed, "contacts": contacts, "received": len(comms.received_queue),
+            "delivered": delivered, "unsent": len(comms.transmission_queue), "load_p50_ms": loads[len(loads) // 2] * 1e3,
+            "load_max_ms": loads[-1] * 1e3, "sessions_per_byte": comms.sessions_per_byte() or 0.0, **sim.stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark comms.contact() against the Iridium simulator")
+    parser.add_argument("--profile", choices=PROFILES, action="append")
+    parser.add_argument("--packets", type=int, default=10)
+    parser.add_argument("--mt", type=int, default=2)
+    parser.add_argument("--scale", type=float, default=0.05)
+    args = parser.parse_args()
+    backend.select(backend.SIM)
+    gpio.start()
+    for profile in args.profile or ["ideal", "realistic", "worst"]:
+        result = run(profile, args.packets, args.mt, args.scale)
+        print(", ".join(f"{k}: {v:.2f}" if isinstance(v, float) else f"{k}: {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Allocations per packet when building one MO message: the old byte list path, each record encoded into its own buffer
+# and joined, and every record encoded into the reusable frame slot
+# Run from the repository root: python -m benchmarks.encode_alloc
+# Pinned FLOAT3 and the auto path's FLOAT3 result are encoded in place, only a winning compact encoding is built
+# separately and copied in. Most allocations left are NumPy temporaries inside the codec, which all paths share, so the
+# slot saves about two blocks per packet over the joined path and no measurable time, and with FLOAT3 pinned costs
+# about what the old path did. pyserial copies the frame to bytes when it is written either way
+
+import argparse
+import gc
+import random
+import sys
+import time
+import codec
+import comms
+
+
+def legacy_encode(packet):
+    """
+    _encode as it was: a list of ints grown with +=
+    """
+    encoded_bytes_list = [(packet.index << 1) & 0x7f | packet.numerical]
+    date = (packet.timestamp.day << 11) | (packet.timestamp.hour << 6) | packet.timestamp.minute
+    encoded_bytes_list += [(date >> 8) & 0xff, date & 0xff, comms.DESCRIPTOR_IDS[packet.descriptor]]
+    encoding, data = codec.encode_values(packet.return_data, comms.DESCRIPTOR_ENCODINGS.get(packet.descriptor))
+    if encoding != codec.FLOAT3:
+        encoded_bytes_list[0] |= 0x80
+        encoded_bytes_list.append(encoding)
+    encoded_bytes_list += data
+    return encoded_bytes_list
+
+
+def legacy_message(packets):
+    """
+    Frame as a list, then what load_mo and serial.write did with it: checksum bytes appended, converted to bytes
+    """
+    message = list(codec.build_frame([legacy_encode(packet) for packet in packets], [packet.last_chunk for packet in packets]))
+    checksum = sum(message) & 0xffff
+    message.append(checksum >> 8)
+    message.append(checksum & 0xff)
+    return bytes(message)
+
+
+def joined_message(packets):
+    """
+    The current encoder without the slot: each record in its own buffer, joined by codec.build_frame
+    """
+    records = []
+    for packet in packets:
+        buffer = bytearray(comms.MAX_PACKET_SIZE)
+        records.append(buffer[:comms._encode_into(packet, memoryview(buffer))])
+    message = codec.build_frame(records, [packet.last_chunk for packet in packets])
+    checksum = sum(message) & 0xffff
+    return message, bytes((checksum >> 8, checksum & 0xff))
+
+
+def slot_message(packets):
+    """
+    The current path: frame encoded into the slot, load_mo writes the view and a 2 byte checksum
+    """
+    message, checksum, _ = comms._build_frame(packets)
+    return message, bytes((checksum >> 8, checksum & 0xff))
+
+
+def allocations(fn):
+    """
+    Counts the growth in sys.getallocatedblocks() between profiler events during one call. Blocks allocated and freed
+    between two events cancel out, and NumPy array data above pymalloc's 512 bytes is not counted, so this is a lower
+    bound on object allocations, plus a few blocks of profiler overhead
+    :return: (int) blocks allocated
+    """
+    total, last = 0, sys.getallocatedblocks()
+    def profile(frame, event, arg):
+        nonlocal total, last
+        now = sys.getallocatedblocks()
+        if now > last: total += now - last
+        last = sys.getallocatedblocks()
+
+    gc.disable()
+    sys.setprofile(profile)
+    try: fn()
+    finally:
+        sys.setprofile(None)
+        gc.enable()
+    return total
+
+
+def measure(fn, repeat):
+    """
+    :return: (tuple) blocks allocated per call, median of five, seconds per call
+    """
+    fn()  # warm up caches and the slot
+    blocks = sorted(allocations(fn) for _ in range(5))[2]
+    start = time.perf_counter()
+    for _ in range(repeat): fn()
+    return blocks, (time.perf_counter() - start) / repeat
+
+
+def run(packets=8, values=30, encoding=None, repeat=200, seed=0):
+    """
+    :param packets: (int) queued packets, values each, packed into one message
+    :param encoding: (int) codec encoding to pin, None to let each packet pick
+    :return: (dict) blocks allocated per packet and microseconds per message for each path
+    """
+    rng = random.Random(seed)
+    if encoding is None: comms.DESCRIPTOR_ENCODINGS.pop("filler", None)
+    else: comms.DESCRIPTOR_ENCODINGS["filler"] = encoding
+    comms.transmission_queue.clear()
+    for _ in range(packets):
+        packet = comms.Packet("filler", return_data=[round(rng.uniform(0, 50), 2) for _ in range(values)])
+        packet.set_time()
+        comms.append_to_queue(packet)
+    queued = comms.transmission_queue.peek_many(comms.FRAME_LOOKAHEAD + 1)
+    packed = comms._build_frame()[2]
+    assert legacy_message(packed)[:-2] == joined_message(packed)[0] == bytes(slot_message(packed)[0])
+    legacy_blocks, legacy_time = measure(lambda: legacy_message(packed), repeat)
+    joined_blocks, joined_time = measure(lambda: joined_message(packed), repeat)
+    slot_blocks, slot_time = measure(lambda: slot_message(packed), repeat)
+    return {"queued": len(queued), "packed": len(packed), "message_bytes": len(slot_message(packed)[0]),
+            "legacy_allocs_per_packet": legacy_blocks / len(packed), "joined_allocs_per_packet": joined_blocks / len(packed),
+            "slot_allocs_per_packet": slot_blocks / len(packed),
+            "legacy_us": legacy_time * 1e6, "joined_us": joined_time * 1e6, "slot_us": slot_time * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MO message encoding allocations")
+    parser.add_argument("--packets", type=int, default=8)
+    parser.add_argument("--values", type=int, default=30)
+    args = parser.parse_args()
+    for name, encoding in (("auto", None), ("float3", codec.FLOAT3)):
+        result = run(args.packets, args.values, encoding)
+        print(f"{name}: " + ", ".join(f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# AT response latency benchmark, buffered reader vs the old byte-at-a-time reader
+# Run from the repository root: python -m benchmarks.iridium_read
+
+import threading
+import time
+from drivers.iridium import Iridium
+
+BYTE_TIME = 10 / 19200  # 8N1 at 19200 baud
+RESPONSES = {
+    "AT+SBDS": (0.02, b"AT+SBDS\r\r\n+SBDS: 0, 12, 0, -1\r\n\r\nOK\r\n"),
+    "AT+CSQF": (0.02, b"AT+CSQF\r\r\n+CSQF:4\r\n\r\nOK\r\n"),
+    "AT-MSSTM": (0.02, b"AT-MSSTM\r\r\n-MSSTM: 7d5a2b1c\r\n\r\nOK\r\n"),
+    "AT-MSGEO": (0.02, b"AT-MSGEO\r\r\n-MSGEO: -2475,5014,2437,7d5a2b1c\r\n\r\nOK\r\n"),
+    "AT+SBDIX": (0.5, b"AT+SBDIX\r\r\n+SBDIX: 1, 13, 0, -1, 0, 0\r\n\r\nOK\r\n"),
+}
+
+
+class FakeSerial:
+    """
+    Minimal stand-in for a Serial port attached to a modem that answers at 19200 baud after a fixed latency
+    """
+    def __init__(self, timeout):
+        self.timeout, self.is_open = timeout, True
+        self._rx, self._arrival, self._pos = b"", [], 0
+        self._cond = threading.Condition()
+
+    def _available(self):
+        now, n = time.perf_counter(), self._pos
+        while n < len(self._rx) and self._arrival[n] <= now: n += 1
+        return n - self._pos
+
+    @property
+    def in_waiting(self):
+        return self._available()
+
+    def write(self, data):
+        latency, response = RESPONSES[data.decode("utf-8").strip()]
+        start = time.perf_counter() + latency
+        self._rx = self._rx[self._pos:] + response
+        self._arrival = self._arrival[self._pos:] + [start + i * BYTE_TIME for i in range(len(response))]
+        self._pos = 0
+        return len(data)
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + self.timeout
+        while not self._available() and time.perf_counter() < deadline:
+            time.sleep(BYTE_TIME / 4)
+        n = min(size, self._available())
+        out = self._rx[self._pos:self._pos + n]
+        self._pos += n
+        return out
+
+    def read_until(self, expected=b"\n", size=None):
+        line = bytearray()
+        while True:
+            c = self.read(1)
+            if not c: break
+            line += c
+            if line[-len(expected):] == expected: break
+        return bytes(line)
+
+    def reset_input_buffer(self):
+        self._pos += self._available()
+
+    def flush(self):
+        pass
+
+
+class LegacyIridium(Iridium):
+    """
+    The previous polling reader: 100 ms sleeps in _request and single byte reads capped at 50 bytes in _read
+    """
+    def _request(self, command, timeout=0.5):
+        self.serial.flush()
+        self.serial.write((command + "\r").encode("utf-8"))
+        result, sttime = "", time.perf_counter()
+        while time.perf_counter() - sttime < timeout:
+            time.sleep(.1)
+            result += self._read()
+            if result.find("ERROR") != -1: return command[2:] + "ERROR" + "\n"
+            if result.find("OK") != -1: return result
+        raise ValueError("Iridium Timeout")
+
+    def _read(self, timeout=0.5):
+        output = bytes()
+        for _ in range(50):
+            next_byte = self.serial.read(size=1)
+            if next_byte == bytes(): break
+            output += next_byte
+        return output.decode("utf-8")
+
+
+def _driver(cls, serial_timeout):
+    driver = cls.__new__(cls)
+    driver.serial = FakeSerial(serial_timeout)
+    return driver
+
+
+def _time(driver, command, timeout, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        driver._process(command, timeout=timeout)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], samples[-1]
+
+
+def main(runs=10):
+    legacy, buffered = _driver(LegacyIridium, 1), _driver(Iridium, 0.05)
+    print(f"{'command':<10}{'legacy p50':>12}{'legacy max':>12}{'new p50':>12}{'new max':>12}  (ms)")
+    for command, (latency, _) in RESPONSES.items():
+        timeout = 60 if command == "AT+SBDIX" else 2
+        old, new = _time(legacy, command, timeout, runs), _time(buffered, command, timeout, runs)
+        print(f"{command:<10}{old[0] * 1e3:>12.1f}{old[1] * 1e3:>12.1f}{new[0] * 1e3:>12.1f}{new[1] * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Queue journal throughput under each fsync policy, and recovery time at boot
+# Run from the repository root: python -m benchmarks.journal_throughput --dir /home/pi
+# Point --dir at the SD card, a tmpfs makes every policy look free
+
+import argparse
+import os
+import tempfile
+import time
+from journal import Journal, FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER
+
+RECORD = {"descriptor": "filler", "args": [], "return_data": [float(i) for i in range(20)], "numerical": 1,
+          "index": 0, "timestamp": "2024-01-01T00:00:00", "priority": 5, "expires": None}
+
+
+def run(directory, policy, count, acked=0.5):
+    """
+    :param directory: (str) where to put the segment
+    :param policy: (str) fsync policy
+    :param count: (int) records to enqueue
+    :param acked: (float) fraction acknowledged before the simulated reboot
+    :return: (dict) enqueue and ack rates, recovery time and records recovered
+    """
+    path = os.path.join(directory, f"journal-bench-{policy}.log")
+    if os.path.exists(path): os.remove(path)
+    journal = Journal(path, fsync=policy, compact_bytes=1 << 40)
+    start = time.perf_counter()
+    ids = [journal.append("tx", RECORD) for _ in range(count)]
+    enqueue = time.perf_counter() - start
+    start = time.perf_counter()
+    for journal_id in ids[:int(count * acked)]: journal.ack(journal_id)
+    ack = time.perf_counter() - start
+    journal.close()
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    recovered = len(Journal(path, fsync=policy).pending("tx"))
+    recovery = time.perf_counter() - start
+    os.remove(path)
+    return {"policy": policy, "enqueue_per_s": count / enqueue, "ack_per_s": int(count * acked) / ack if acked else 0.0,
+            "segment_kb": size / 1024, "recovery_ms": recovery * 1e3, "recovered": recovered}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the queue journal")
+    parser.add_argument("--dir", default=tempfile.gettempdir())
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+    for policy in (FSYNC_NEVER, FSYNC_BATCH, FSYNC_ALWAYS):
+        result = run(args.dir, policy, args.count)
+        print(", ".join(f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
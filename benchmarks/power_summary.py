@@ -0,0 +1,50 @@
+# Power statistics engine, update cost per sample and block, and downlink bytes of raw samples vs one summary packet
+# Run from the repository root: python -m benchmarks.power_summary
+
+import argparse
+import time
+import numpy as np
+import codec
+import power
+
+
+def synthetic(seconds, rate, rng):
+    """
+    :return: (tuple) times, rows in gpio.POWER_FIELDS order, an orbit of sun and eclipse with SBDIX current bursts
+    """
+    t = np.arange(0, seconds, 1 / rate)
+    sun = np.clip(np.sin(2 * np.pi * t / 5560), 0, None)
+    rows = np.empty((len(t), 7))
+    rows[:, 0], rows[:, 2] = 0.45 * sun, 0.4 * sun
+    rows[:, 1], rows[:, 3] = 8.4 * (sun > 0), 8.3 * (sun > 0)
+    rows[:, 5] = 0.12 + 1.3 * ((t % 600) < 10) + rng.normal(0, 0.005, len(t))
+    rows[:, 4] = 7.6 - 0.2 * rows[:, 5] + rng.normal(0, 0.005, len(t))
+    rows[:, 6] = 0.05
+    return t, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark power statistics and summary size")
+    parser.add_argument("--seconds", type=float, default=5560)
+    parser.add_argument("--rate", type=float, default=10)
+    parser.add_argument("--block", type=int, default=256)
+    args = parser.parse_args()
+    t, rows = synthetic(args.seconds, args.rate, np.random.default_rng(0))
+
+    monitor, start = power.PowerMonitor(capacity=3.0, soc=0.8), time.perf_counter()
+    for i in range(len(t)): monitor.update(rows[i], t[i])
+    single = time.perf_counter() - start
+    monitor, start = power.PowerMonitor(capacity=3.0, soc=0.8), time.perf_counter()
+    for i in range(0, len(t), args.block): monitor.add(t[i:i + args.block], rows[i:i + args.block])
+    block = time.perf_counter() - start
+    print(f"update   {len(t) / single:10.0f} samples/s")
+    print(f"add x{args.block:<4}{len(t) / block:10.0f} samples/s")
+
+    raw = len(codec.encode_values(rows.ravel().tolist(), codec.FLOAT3)[1])
+    summary = len(codec.encode_values(monitor.summary())[1])
+    print(f"raw float3 {raw:10d} bytes  summary {summary:4d} bytes  ratio {raw / summary:8.0f}x")
+    print(f"soc {monitor.soc():.3f}  charge out {monitor.charge_out:.1f} C  solar {monitor.solar_energy:.0f} J")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# Ring alert to received_queue latency, simulated GPIO and modem
+# Run from the repository root: python -m benchmarks.ring_latency
+
+import time
+import comms
+from drivers import backend, gpio
+from drivers.iridium import Iridium
+from sim.iridium import IridiumSimulator
+
+
+def main(messages=10, sbdix_latency=0.5):
+    backend.select(backend.SIM)
+    gpio.start()
+    sim = IridiumSimulator(latency=0.02, sbdix_latency=sbdix_latency)
+    with sim:
+        sim.wire(backend.gpio(), gpio.NET_AVAIL, gpio.RING_INDICATOR)
+        comms.iridium = Iridium(port=sim.port, baudrate=19200)
+        comms.enable_ring_alerts()
+        samples = []
+        for i in range(messages):
+            received, start = len(comms.received_queue), time.perf_counter()
+            sim.deliver_mt(bytes([0]))
+            while len(comms.received_queue) == received and time.perf_counter() - start < 10: time.sleep(0.001)
+            samples.append(time.perf_counter() - start)
+        comms.disable_ring_alerts()
+        comms.iridium.serial.close()
+    samples.sort()
+    print(f"{messages} MT messages, SBDIX takes {sbdix_latency * 1e3:.0f} ms: ring to received_queue "
+          f"p50 {samples[len(samples) // 2] * 1e3:.1f} ms, max {samples[-1] * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
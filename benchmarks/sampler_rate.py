@@ -0,0 +1,38 @@
+# Background power sampler, achieved raw rate, overruns and snapshot cost while sampling runs
+# Run from the repository root: python -m benchmarks.sampler_rate
+# On the Pi, --hardware reads the real MCP3208, otherwise the simulated one answers after --latency seconds per transfer
+
+import argparse
+import time
+from drivers import backend, gpio
+from drivers.sampler import Sampler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the background power sampler")
+    parser.add_argument("--hardware", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per simulated SPI transfer")
+    parser.add_argument("--rates", type=float, nargs="+", default=[100, 500, 1000, 2000])
+    parser.add_argument("--decimation", type=int, default=10)
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+    if not args.hardware: backend.select(backend.SIM, spi_latency=args.latency)
+    gpio.start()
+    for rate in args.rates:
+        sampler = Sampler(rate=rate, decimation=args.decimation, order=args.order)
+        sampler.start()
+        snapshots, start = 0, time.perf_counter()
+        while time.perf_counter() - start < args.duration:
+            sampler.snapshot(256)
+            snapshots += 1
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        raw = sampler.count * args.decimation / elapsed
+        print(f"target {rate:7.0f}/s  achieved {raw:7.0f}/s  overruns {sampler.overruns:6d}  "
+              f"snapshots {snapshots / elapsed:6.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
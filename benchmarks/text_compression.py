@@ -0,0 +1,64 @@
+# Text packet compression: size and CPU time per packet, with and without a trained preset dictionary
+# Run from the repository root on the Pi: python -m benchmarks.text_compression
+# Pass real downlinks with --samples (one payload per line) to train and test on them instead of synthetic traffic
+
+import argparse
+import random
+import time
+import codec
+
+EVENTS = ["watchdog kicked", "imu poll ok", "sbdix session complete", "adc scan complete", "rtc synced to network",
+          "payload idle", "mo buffer cleared", "ring alert received", "battery heater off", "battery heater on"]
+
+
+def synthetic(count, seed):
+    """
+    :return: (list) status and log lines like the ones downlinked in flight
+    """
+    rng, lines = random.Random(seed), []
+    for i in range(count):
+        if rng.random() < 0.5:
+            lines.append(f"STATUS batt_v={rng.uniform(3.6, 4.2):.2f} solar_i={rng.uniform(0, 0.5):.3f} "
+                         f"temp={rng.uniform(-10, 40):.1f} mode={rng.choice(['NOMINAL', 'SAFE'])} uptime={1000 + 60 * i} "
+                         f"err={rng.choice([0, 0, 0, 3])} q={rng.randint(0, 40)}".encode())
+        else:
+            lines.append(" | ".join(f"{60 * i + j}: {rng.choice(EVENTS)}" for j in range(rng.randint(1, 4))).encode())
+    return lines
+
+
+def run(lines, size=1024):
+    """
+    Trains on the first half of lines, measures on the second
+    :param size: (int) dictionary size, 0 for no dictionary
+    :return: (dict) bytes before and after, packets left uncompressed, CPU microseconds per packet
+    """
+    train, test = lines[:len(lines) // 2], lines[len(lines) // 2:]
+    dictionary = codec.train_dictionary(train, size) if size else b""
+    start = time.process_time()
+    compressed = [codec.compress_text(line, dictionary) for line in test]
+    compress_time = time.process_time() - start
+    start = time.process_time()
+    for data in compressed:
+        if data is not None: codec.decompress_text(data, dictionary)
+    decompress_time = time.process_time() - start
+    sent = sum(len(c) if c is not None else len(l) for c, l in zip(compressed, test))
+    return {"dictionary": len(dictionary), "raw_bytes": sum(map(len, test)), "sent_bytes": sent,
+            "uncompressed": sum(c is None for c in compressed), "compress_us": compress_time / len(test) * 1e6,
+            "decompress_us": decompress_time / len(test) * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text packet compression")
+    parser.add_argument("--samples", help="file of real payloads, one per line")
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+    if args.samples:
+        with open(args.samples, "rb") as f: lines = [line.rstrip(b"\r\n") for line in f if line.strip()]
+    else: lines = synthetic(args.count, 0)
+    for size in (0, 256, 1024, 4096):
+        result = run(lines, size)
+        print(", ".join(f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+# Telemetry value codecs
+# The 3 byte decimal float: bits 23-19 hold the power of ten as 5 bit twos complement, bits 18-0 hold five significant
+# digits as 19 bit twos complement, MSB first. value = mantissa / 10000 * 10 ** exponent
+# encode_floats/decode_floats work on whole packets with NumPy array operations and are bit exact with the scalar
+# encode_float/decode_float, which are kept as the reference implementation
+
+from collections import Counter
+import math, re, sys, zlib
+import numpy as np
+
+FLOAT_LEN = 3
+EXP_MIN, EXP_MAX = -16, 15  # range of the 5 bit exponent, values outside it wrap like the scalar encoder
+_POW10_OFFSET = 323
+_POW10 = np.array([10 ** e for e in range(-_POW10_OFFSET, 309)], dtype=np.float64)  # same doubles Python's 10 ** e gives
+_LOG_GUARD = 1e-9  # np.log10 may be an ulp off math.log10, only matters this close to an integer
+
+
+def encode_float(n):
+    """
+    Scalar reference encoder
+    :param n: (float) value to encode, must be finite
+    :return: (int) 24 bit packed value
+    """
+    flt, exp = 0, int(math.floor(math.log10(abs(n)))) if n != 0 else 0
+    num = abs(int((n / (10 ** exp)) * 10000))  # five digits, from the true exponent before it is packed
+    if exp < 0:
+        exp = (1 << 4) - (abs(exp) & 0xf)  # 4 bits of twos comp below the sign bit
+        flt |= 1 << 23  # set sign bit
+    flt |= (exp & 0xf) << 19
+    if n < 0:
+        num = (1 << 18) - (num & 0x3ffff)  # make sure num is 18 bits long, then twos comp
+        flt |= (1 << 18)  # set sign bit
+    flt |= num & 0x3ffff
+    return flt
+
+
+def decode_float(flt):
+    """
+    Scalar reference decoder
+    :param flt: (int) 24 bit packed value
+    :return: (float) decoded value
+    """
+    exp, coef = flt >> 19, flt & 0x7ffff
+    if exp & 0x10: exp -= 1 << 5  # convert twos comp
+    if coef & 0x40000: coef -= 1 << 19
+    return coef / 10000 * 10 ** exp
+
+
+def _exponents(values):
+    """
+    floor(log10(|values|)), 0 for zeros, matching math.log10 exactly
+    :param values: (np.ndarray) float64 values, finite
+    :return: (np.ndarray) int64 exponents
+    """
+    magnitude = np.abs(values)
+    nonzero = magnitude != 0
+    logs = np.zeros_like(magnitude)
+    np.log10(magnitude, out=logs, where=nonzero)
+    close = np.flatnonzero(np.abs(logs - np.round(logs)) < _LOG_GUARD)
+    for i in close:  # rare, exact powers of ten and their neighbours
+        if nonzero[i]: logs[i] = math.log10(magnitude[i])
+    return np.floor(logs).astype(np.int64)
+
+
+def encode_floats(values, out=None):
+    """
+    Batch encoder
+    :param values: (list or np.ndarray) numbers to encode, must be finite
+    :param out: (writable bytes-like) optional destination, written in place from its start
+    :return: (bytes) FLOAT_LEN bytes per value, MSB first, or the number of bytes written to out
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if not np.isfinite(values).all(): raise ValueError("Cannot encode non-finite values")
+    exp = _exponents(values)
+    scale = _POW10[np.maximum(exp + _POW10_OFFSET, 0)]  # finite doubles keep exp <= 308, the top of the table
+    num = np.abs(np.trunc(values / scale * 10000).astype(np.int64))
+    negative_exp, negative = exp < 0, values < 0
+    flt = np.where(negative_exp, (1 << 23) | ((((1 << 4) - (np.abs(exp) & 0xf)) & 0xf) << 19), (exp & 0xf) << 19)
+    flt |= np.where(negative, (((1 << 18) - (num & 0x3ffff)) & 0x3ffff) | (1 << 18), num & 0x3ffff)
+    if out is None: packed = np.empty((len(values), FLOAT_LEN), dtype=np.uint8)
+    elif len(out) < len(values) * FLOAT_LEN: raise ValueError("Encoded values do not fit")
+    else: packed = np.frombuffer(out, dtype=np.uint8, count=len(values) * FLOAT_LEN).reshape(-1, FLOAT_LEN)
+    packed[:, 0], packed[:, 1], packed[:, 2] = (flt >> 16) & 0xff, (flt >> 8) & 0xff, flt & 0xff  # MSB FIRST, ..., # LSB LAST
+    return packed.tobytes() if out is None else packed.size
+
+
+def decode_floats(data):
+    """
+    Batch decoder
+    :param data: (bytes-like) packed values, trailing partial values are ignored
+    :return: (np.ndarray) float64 values
+    """
+    raw = np.frombuffer(data, dtype=np.uint8, count=len(data) // FLOAT_LEN * FLOAT_LEN).reshape(-1, FLOAT_LEN)
+    flt = (raw[:, 0].astype(np.int64) << 16) | (raw[:, 1].astype(np.int64) << 8) | raw[:, 2]
+    exp, coef = flt >> 19, flt & 0x7ffff
+    exp -= (exp & 0x10) << 1  # convert twos comp
+    coef -= (coef & 0x40000) << 1
+    return coef / 10000 * _POW10[exp + _POW10_OFFSET]
+
+
+# Compact encodings, chosen per packet. FLOAT3 needs no tag, the others are announced by one encoding byte
+FLOAT3, DELTA_VARINT, INT16 = 0, 1, 2
+ENCODINGS = (FLOAT3, DELTA_VARINT, INT16)
+TAG_LEN = 1  # encoding byte in front of a compact payload
+_SCALES = range(-10, 16)  # decimal scales tried for DELTA_VARINT, coarsest first
+_Q_LIMIT = 1 << 61  # keeps deltas of quantized values inside int64
+_INT16_MAX = 32767
+# Worst case size of each encoding, (bytes before the values, bytes per value) with the encoding byte. Picking never
+# chooses something larger than FLOAT3, so FLOAT3's bound also holds when no encoding is forced
+_WIDTHS = {FLOAT3: (0, FLOAT_LEN), DELTA_VARINT: (TAG_LEN + 1, 9), INT16: (TAG_LEN + 4, 2)}  # |delta| < 2 * _Q_LIMIT zig-zags into 9 varint bytes
+
+
+def _descale(q, scale):
+    """
+    Quantized integers back to values, identical on both ends
+    :param q: (np.ndarray) integers
+    :param scale: (int) decimal places kept
+    """
+    return q / 10 ** scale if scale >= 0 else q * 10 ** -scale
+
+
+def _float3_error(values, encoded=None):
+    """
+    :param values: (np.ndarray) float64 values
+    :param encoded: (bytes-like) values already FLOAT3 encoded, so they aren't encoded again
+    :return: (np.ndarray) per value error of a FLOAT3 round trip, the bar the compact encodings must meet
+    """
+    if encoded is None: encoded = encode_floats(values)
+    return np.abs(values - decode_floats(encoded)) + np.abs(values) * 1e-15
+
+
+def _varint_lengths(z):
+    """
+    :param z: (np.ndarray) uint64 values
+    :return: (np.ndarray) LEB128 length of each, in bytes
+    """
+    lengths = np.ones(len(z), dtype=np.int64)
+    for k in range(1, 10): lengths += z >= np.uint64(1 << (7 * k))
+    return lengths
+
+
+def _zigzag(d):
+    """
+    :param d: (np.ndarray) int64 values
+    :return: (np.ndarray) uint64 values, small magnitudes of either sign small
+    """
+    return ((d << 1) ^ (d >> 63)).astype(np.uint64)
+
+
+def _varints(z):
+    """
+    LEB128, vectorized
+    :param z: (np.ndarray) uint64 values
+    :return: (bytes) 7 bits per byte, least significant group first, high bit set on all but the last byte
+    """
+    lengths = _varint_lengths(z)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max(initial=0))):
+        present = lengths > k
+        group = (z[present] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        out[starts[present] + k] = group | np.where(lengths[present] > k + 1, 0x80, 0).astype(np.uint64)
+    return out.tobytes()
+
+
+def _unvarints(data):
+    """
+    :param data: (bytes-like) concatenated LEB128 varints
+    :return: (np.ndarray) uint64 values, a trailing unterminated varint is ignored
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(raw < 0x80)
+    if len(ends) == 0: return np.zeros(0, dtype=np.uint64)
+    raw = raw[:ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = (np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)) * 7
+    return np.bitwise_or.reduceat((raw & 0x7f).astype(np.uint64) << shifts.astype(np.uint64), starts)
+
+
+def _delta_scale(values, tolerance):
+    """
+    :return: (tuple) coarsest decimal scale that meets tolerance and the values quantized to it, None if none does
+    """
+    for scale in _SCALES:
+        q = np.round(values * 10.0 ** scale)
+        if len(q) and np.abs(q).max() >= _Q_LIMIT: return None
+        if np.all(np.abs(values - _descale(q, scale)) <= tolerance): return scale, q
+    return None
+
+
+def _encode_delta(values, tolerance):
+    """
+    Values quantized to the coarsest decimal scale that meets tolerance, first value then successive differences,
+    each zig-zag mapped and varint packed
+    :return: (bytes) scale byte and varints, None if no scale meets tolerance
+    """
+    found = _delta_scale(values, tolerance)
+    if found is None: return None
+    scale, q = found
+    return bytes([scale & 0xff]) + _varints(_zigzag(np.diff(q.astype(np.int64), prepend=np.int64(0))))
+
+
+def _decode_delta(data):
+    scale = data[0] - 0x100 if data[0] & 0x80 else data[0]
+    zigzag = _unvarints(data[1:])
+    deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    return _descale(np.cumsum(deltas), scale)
+
+
+def _encode_int16(values, tolerance):
+    """
+    Fixed point, one float32 scale per packet
+    :return: (bytes) scale then int16 values, MSB first, None if it would not meet tolerance
+    """
+    peak = np.abs(values).max(initial=0)
+    scale = np.float32(peak / _INT16_MAX) if peak > 0 else np.float32(1)
+    if not np.isfinite(scale) or scale == 0: return None
+    q = np.clip(np.round(values / np.float64(scale)), -_INT16_MAX, _INT16_MAX)
+    if np.any(np.abs(values - q * np.float64(scale)) > tolerance): return None
+    return np.array([scale], dtype=">f4").tobytes() + q.astype(">i2").tobytes()
+
+
+def _decode_int16(data):
+    scale = np.frombuffer(data, dtype=">f4", count=1)[0]
+    return np.frombuffer(data, dtype=">i2", offset=4).astype(np.float64) * np.float64(scale)
+
+
+def encode_values(values, encoding=None):
+    """
+    Encodes numeric telemetry
+    :param values: (list or np.ndarray) numbers to encode, must be finite
+    :param encoding: (int) FLOAT3, DELTA_VARINT or INT16 to force one, None picks the smallest encoding whose error
+    is no worse than FLOAT3's for every value. The compact encodings are charged TAG_LEN for their encoding byte
+    :return: (tuple) encoding used, encoded bytes
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if encoding == FLOAT3: return FLOAT3, encode_floats(values)
+    tolerance = _float3_error(values)
+    if encoding == DELTA_VARINT or encoding == INT16:
+        data = (_encode_delta if encoding == DELTA_VARINT else _encode_int16)(values, tolerance if encoding == DELTA_VARINT else np.inf)
+        if data is None: raise ValueError(f"Values out of range for encoding {encoding}")
+        return encoding, data
+    if encoding is not None: raise ValueError(f"Unknown encoding {encoding}")
+    float3 = encode_floats(values)
+    compact = _smallest_compact(values, _float3_error(values, float3), len(float3))
+    return compact if compact is not None else (FLOAT3, float3)
+
+
+def _smallest_compact(values, tolerance, limit):
+    """
+    :param tolerance: (np.ndarray) per value error allowed, FLOAT3's
+    :param limit: (int) bytes to beat, the FLOAT3 payload size
+    :return: (tuple) smallest compact encoding under limit including its encoding byte and its bytes, None if none is
+    """
+    best = None
+    for candidate, encoder in ((DELTA_VARINT, _encode_delta), (INT16, _encode_int16)):
+        data = encoder(values, tolerance)
+        if data is not None and len(data) + TAG_LEN < (limit if best is None else len(best[1]) + TAG_LEN):
+            best = (candidate, data)
+    return best
+
+
+def encode_values_into(values, out, encoding=None):
+    """
+    encode_values straight into a message buffer. FLOAT3 is written in place. When picking, that in place FLOAT3
+    payload is also the reference the compact encodings are measured against, so nothing is encoded twice, and a
+    compact encoding that wins is copied over it once, after its encoding byte
+    :param values: (list or np.ndarray) numbers to encode, must be finite
+    :param out: (writable bytes-like) destination, eg a memoryview slice of the message slot
+    :param encoding: (int) forced encoding, None to pick the smallest
+    :return: (tuple) encoding used, bytes written including the encoding byte
+    """
+    if encoding == FLOAT3: return FLOAT3, encode_floats(values, out)
+    values = np.asarray(values, dtype=np.float64).ravel()
+    size = len(values) * FLOAT_LEN
+    if encoding is None and size <= len(out):
+        encode_floats(values, out)
+        compact = _smallest_compact(values, _float3_error(values, out[:size]), size)
+        if compact is None: return FLOAT3, size
+        encoding, data = compact
+    else: encoding, data = encode_values(values, encoding)
+    size = len(data) + (TAG_LEN if encoding != FLOAT3 else 0)
+    if size > len(out): raise ValueError("Encoded values do not fit")
+    if encoding != FLOAT3: out[0] = encoding
+    out[size - len(data):size] = data
+    return encoding, size
+
+
+def decode_values(encoding, data):
+    """
+    :param encoding: (int) FLOAT3, DELTA_VARINT or INT16
+    :param data: (bytes-like) encoded values, without the encoding byte
+    :return: (np.ndarray) float64 values
+    """
+    if encoding == FLOAT3: return decode_floats(data)
+    if encoding == DELTA_VARINT: return _decode_delta(bytes(data)) if len(data) else np.zeros(0)
+    if encoding == INT16: return _decode_int16(bytes(data))
+    raise ValueError(f"Unknown encoding {encoding}")
+
+
+def encoded_size(values, encoding=None):
+    """
+    :return: (int) bytes encode_values output occupies in a packet, encoding byte included
+    """
+    encoding, data = encode_values(values, encoding)
+    return len(data) + (TAG_LEN if encoding != FLOAT3 else 0)
+
+
+def size_estimate(values, encoding=None):
+    """
+    DELTA_VARINT size of every value, worked out once so fit() can size all the slices of values without encoding
+    them. Each is sized at the scale that meets tolerance for all of values
+    :param values: (list or np.ndarray) numbers to encode
+    :param encoding: (int) forced encoding, None to let each slice pick
+    :return: (tuple) varint bytes of each value heading a slice, cumulative varint bytes of the deltas before each
+    value, None if DELTA_VARINT can't be used
+    """
+    if encoding == FLOAT3 or encoding == INT16: return None
+    values = np.asarray(values, dtype=np.float64).ravel()
+    found = _delta_scale(values, _float3_error(values))
+    if found is None: return None
+    q = found[1].astype(np.int64)
+    deltas = _varint_lengths(_zigzag(np.diff(q, prepend=np.int64(0))))
+    return _varint_lengths(_zigzag(q)), np.concatenate(([0], np.cumsum(deltas)))
+
+
+def fit(values, budget, encoding=None, start=0, estimate=None):
+    """
+    Largest slice of values from start that encodes into budget bytes, found without a search
+    The encoding's worst case size (FLOAT3's when picking, picking never chooses anything larger) gives a count that
+    always fits, and is exact for FLOAT3 and INT16. A longer slice from estimate is checked with one encode, and only
+    if the estimate was short does a binary search between the two run
+    :param values: (list or np.ndarray) numbers to encode
+    :param budget: (int) bytes available after the packet header
+    :param encoding: (int) forced encoding, None to let each slice pick
+    :param start: (int) first value of the slice
+    :param estimate: (tuple) size_estimate(values, encoding), None to use the worst case only
+    :return: (int) number of values that fit
+    """
+    if encoding is not None and encoding not in _WIDTHS: raise ValueError(f"Unknown encoding {encoding}")
+    fixed, width = _WIDTHS[FLOAT3 if encoding is None else encoding]
+    remaining = max(len(values) - start, 0)
+    lo = min(remaining, max((budget - fixed) // width, 0))
+    if estimate is None or lo == remaining: return lo
+    first, steps = estimate
+    limit = budget - TAG_LEN - 1 - first[start] + steps[start + 1]  # encoding and scale bytes, the slice's first value
+    hi = min(int(np.searchsorted(steps, limit, "right")) - 1 - start, remaining)
+    if hi <= lo or encoded_size(values[start:start + hi], encoding) <= budget: return max(lo, hi)
+    hi -= 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if encoded_size(values[start:start + mid], encoding) <= budget: lo = mid
+        else: hi = mid - 1
+    return lo
+
+
+# Multi-record frames. Each record is prefixed by a varint sub-header, (length << 2) | (last chunk << 1) | final.
+# final is set on the last record in the frame, last chunk on a record holding the last chunk of its packet
+def record_header(length, final, last_chunk=True):
+    """
+    :param length: (int) record length in bytes
+    :param final: (bool) whether this is the last record in the frame
+    :param last_chunk: (bool) whether the record holds the last chunk of its packet
+    :return: (bytes) varint sub-header
+    """
+    value = (length << 2) | (int(last_chunk) << 1) | int(final)
+    return _RECORD_HEADERS[value] if value < len(_RECORD_HEADERS) else _varint(value)
+
+
+def _varint(value):
+    """
+    :param value: (int) non-negative integer
+    :return: (bytes) LEB128
+    """
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+_RECORD_HEADERS = [_varint(value) for value in range(512 << 2)]  # every sub-header for records under 512 bytes, built once
+
+
+def build_frame(records, last_chunks=None):
+    """
+    :param records: (list) encoded records, bytes-like, at least one
+    :param last_chunks: (list) last chunk flag per record, all set by default
+    :return: (bytes) frame, sub-headers included
+    """
+    frame = bytearray()
+    for i, record in enumerate(records):
+        frame += record_header(len(record), i == len(records) - 1, last_chunks[i] if last_chunks else True)
+        frame += bytes(record)
+    return bytes(frame)
+
+
+def split_frame(frame):
+    """
+    :param frame: (bytes-like) frame from build_frame
+    :return: (list) (record, last chunk flag), records are memoryviews into frame
+    """
+    view, records, i = memoryview(frame), [], 0
+    while i < len(view):
+        value, shift = 0, 0
+        while True:
+            if i >= len(view) or shift > 28: raise ValueError("Truncated record header")
+            value |= (view[i] & 0x7f) << shift
+            shift, i = shift + 7, i + 1
+            if not view[i - 1] & 0x80: break
+        length = value >> 2
+        if i + length > len(view): raise ValueError("Truncated record")
+        records.append((view[i:i + length], bool(value & 2)))
+        i += length
+        if value & 1: return records
+    raise ValueError("Frame has no final record")
+
+
+# Text compression. Raw deflate, no zlib header or adler32, primed with a preset dictionary of strings common in past
+# downlinks so even a short status line compresses. Both ends must use the same dictionary
+TEXT_WBITS = -15
+TEXT_LEVEL = 9  # payloads are at most a few hundred bytes, the best level costs next to nothing
+_TOKEN = re.compile(rb"[A-Za-z_]+|[0-9.+-]+|[^A-Za-z_0-9.+-]+")  # words, numbers, punctuation
+_NUMBER = re.compile(rb"[0-9]")
+
+
+def compress_text(data, dictionary=b""):
+    """
+    :param data: (bytes) text to compress
+    :param dictionary: (bytes) preset dictionary
+    :return: (bytes) compressed text, None if compression doesn't make it smaller
+    """
+    compressor = zlib.compressobj(TEXT_LEVEL, zlib.DEFLATED, TEXT_WBITS, **({"zdict": dictionary} if dictionary else {}))
+    compressed = compressor.compress(data) + compressor.flush()
+    return compressed if len(compressed) < len(data) else None
+
+
+def decompress_text(data, dictionary=b""):
+    """
+    :param data: (bytes-like) output of compress_text
+    :param dictionary: (bytes) the preset dictionary it was compressed with
+    :return: (bytes) original text
+    """
+    decompressor = zlib.decompressobj(TEXT_WBITS, **({"zdict": dictionary} if dictionary else {}))
+    text = decompressor.decompress(bytes(data)) + decompressor.flush()
+    if not decompressor.eof: raise ValueError("Truncated compressed text")
+    return text
+
+
+def train_dictionary(samples, size=1024, max_words=4):
+    """
+    Builds a preset dictionary from past downlinks: runs of up to max_words tokens between numbers are scored by how
+    many bytes they would save across the samples, and the best are packed in with the most valuable last, where
+    deflate's distances are shortest
+    :param samples: (iterable) past text payloads, bytes
+    :param size: (int) dictionary size in bytes, deflate can only reach back 32 KiB
+    :param max_words: (int) longest run of words considered
+    :return: (bytes) dictionary
+    """
+    counts = Counter()
+    for sample in samples:
+        words = _TOKEN.findall(sample)
+        for n in range(1, max_words + 1):
+            for i in range(len(words) - n + 1):
+                if not any(_NUMBER.search(word) for word in words[i:i + n]): counts[b"".join(words[i:i + n])] += 1
+    chosen, used = [], 0
+    for string, count in sorted(counts.items(), key=lambda item: (item[1] - 1) * len(item[0]), reverse=True):
+        if count < 2 or len(string) < 4: continue
+        if used + len(string) > size: continue
+        if any(string in c for c in chosen): continue
+        contained = [c for c in chosen if c in string]  # a longer run replaces the pieces it covers
+        chosen = [c for c in chosen if c not in contained] + [string]
+        used += len(string) - sum(len(c) for c in contained)
+    return b"".join(reversed(chosen))
+
+
+def load_dictionary(path):
+    """
+    :param path: (str) dictionary file from train_dictionary
+    :return: (bytes) dictionary, empty if there is no file
+    """
+    try:
+        with open(path, "rb") as f: return f.read()
+    except FileNotFoundError: return b""
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "train":
+        sys.exit("usage: python -m codec train <dictionary file> <sample file>...  (one payload per line)")
+    lines = []
+    for path in sys.argv[3:]:
+        with open(path, "rb") as f: lines += [line.rstrip(b"\r\n") for line in f if line.strip()]
+    with open(sys.argv[2], "wb") as f: f.write(train_dictionary(lines))
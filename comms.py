@@ -1,33 +1,64 @@
 # High level radio handling
 
 from drivers import gpio
-from drivers.iridium import Iridium
+from drivers.iridium import Iridium, CACHE_TTL, MO_SUCCESS_CODES, NO_SIGNAL_CODES
+from drivers.async_iridium import AsyncIridium
+from scheduler import RetryScheduler
+from txqueue import TransmissionQueue, DEFAULT_PRIORITY
+from journal import Journal, FSYNC_BATCH, FSYNC_NEVER
+import registry
+import codec
+from packet import Packet, PacketChunk
 from datetime import datetime
-import copy
+from collections import deque
+import os, time, threading, asyncio
 
 global MAX_PACKET_SIZE, HEADER_SIZE, FLOAT_LEN, TIME_ERR_THRESHOLD, \
-    transmission_queue, received_queue, ENCODED_REGISTRY, iridium
+    transmission_queue, received_queue, REGISTRY, ENCODED_REGISTRY, DESCRIPTOR_IDS, DESCRIPTOR_ENCODINGS, DESCRIPTOR_PRIORITIES, iridium, load_latencies, MAILBOX_CHECK_INTERVAL, \
+    mt_queued, mt_queued_time, session_stats, scheduler, modem_lock, async_modem_lock, RECORD_HEADER_SIZE, FRAME_LOOKAHEAD, \
+    journal, frame_slot, TEXT_DICTIONARY, NETWORK_WAIT, MAX_CHUNKS, ring_pending, ring_thread
 MAX_PACKET_SIZE = 300
 HEADER_SIZE = 4
+RECORD_HEADER_SIZE = len(codec.record_header(MAX_PACKET_SIZE, True)) # Frame sub-header for the largest record
 FLOAT_LEN = 3
+FRAME_LOOKAHEAD = 32 # Queued packets considered when filling a frame
+MAX_CHUNKS = 64 # The chunk index is 6 bits of the first header byte, ground can't reassemble a longer product
+TEXT_DICTIONARY = codec.load_dictionary(os.path.join(os.path.dirname(os.path.abspath(__file__)), "text.dict")) # Trained with python -m codec train, ground needs the same file
+frame_slot = bytearray(MAX_PACKET_SIZE) # Reused for every MO message, contact() holds the modem lock while it is in use
 TIME_ERR_THRESHOLD = 120 # Acceptable time difference between RTC and Iridium network
-transmission_queue = []
+MAILBOX_CHECK_INTERVAL = 600 # Seconds before a known-empty GSS MT queue is worth checking again
+NETWORK_WAIT = 5 # Seconds contact() waits for NET_AVAIL before treating the signal as 0
+transmission_queue = TransmissionQueue() # Thread safe, ordered by descriptor priority then arrival
 received_queue = []
+load_latencies = deque(maxlen=100) # Seconds per load_mo, for estimating how many messages fit in a contact window
+mt_queued, mt_queued_time = None, 0 # MT queued from the last SBDIX, None until a session has reported it
+session_stats = {"sessions": 0, "failed_sessions": 0, "mo_bytes": 0, "mt_bytes": 0}
+scheduler = RetryScheduler()
+modem_lock = threading.Lock() # contact() and ring alert retrieval run on different threads, only one may drive the modem
+async_modem_lock = None # asyncio equivalent, created on first use inside the event loop
+ring_pending = threading.Event() # set by the ring indicator callback, served by the ring thread
+ring_thread = None # thread running _ring_worker() while ring alerts are enabled
+journal = None # Journal both queues are persisted to, see open_journal()
 
-ENCODED_REGISTRY = {
-    0: "filler"
-}
+REGISTRY = registry.load() # Descriptors and commands, from registry.json
+ENCODED_REGISTRY = REGISTRY.names # id to descriptor
+DESCRIPTOR_IDS = REGISTRY.ids # descriptor to id
+DESCRIPTOR_ENCODINGS = REGISTRY.encodings # descriptor to a pinned codec encoding, anything not listed picks the smallest per packet
+DESCRIPTOR_PRIORITIES = REGISTRY.priorities # descriptor to queue priority, lower is sent first, anything not listed gets DEFAULT_PRIORITY
 
 iridium = None
 
-def start():
+def start(asynchronous=False, journal_path=None):
     """
     Starts all items
+    :param asynchronous: (bool) use AsyncIridium, for contact_async()
+    :param journal_path: (str) persist both queues to this file, see open_journal()
     """
     global iridium
+    if journal_path is not None: open_journal(journal_path)
     gpio.start()
     gpio.power_modem_on()
-    iridium = Iridium(port="/dev/serial0", baudrate=19200)
+    iridium = (AsyncIridium if asynchronous else Iridium)(port="/dev/serial0", baudrate=19200, cache_ttl=CACHE_TTL)
 
 
 def disconnect():
@@ -43,19 +74,134 @@ def disconnect():
     iridium = None
 
 
-def append_to_queue(packet):
+async def disconnect_async():
+    """
+    Shuts down the Iridium modem when it was started with start(asynchronous=True)
+    """
+    global iridium
+    try: await iridium.shutdown()
+    except Exception: pass  # serial doesn't work
+    gpio.power_modem_off()
+    iridium = None
+
+
+def open_journal(path, fsync=FSYNC_BATCH):
+    """
+    Persists both queues to an append-only journal, restoring whatever a previous run left unsent or unprocessed
+    Sent packets are only acknowledged once SBDIX confirms the MO transfer, received ones once they are popped
+    :param path: (str) journal segment file
+    :param fsync: (str) journal fsync policy
+    """
+    global journal, transmission_queue, received_queue
+    journal = Journal(path, fsync)
+    for journal_id, record in journal.pending("tx"):
+        packet = _packet_from_record(record)
+        packet.journal_id = journal_id
+        deadline = transmission_queue.clock() + record["expires"] - time.time() if record["expires"] is not None else None
+        transmission_queue.push(packet, record["priority"], deadline)
+    for journal_id, record in journal.pending("rx"):
+        packet = _packet_from_record(record)
+        packet.journal_id = journal_id
+        received_queue.append(packet)
+    transmission_queue.on_drop = _acknowledge
+
+
+def close_journal():
+    """
+    Syncs and closes the journal, queues stay in memory only
+    """
+    global journal, transmission_queue
+    if journal is not None: journal.close()
+    journal, transmission_queue.on_drop = None, None
+
+
+def _acknowledge(packet):
+    """
+    Marks a packet done in the journal, if it is journaled
+    :param packet: (Packet) sent, expired or processed packet
+    """
+    global journal
+    if journal is not None and packet.journal_id is not None: journal.ack(packet.journal_id)
+
+
+def _packet_record(packet, **extra):
+    """
+    :return: (dict) JSON serializable copy of a packet for the journal
+    """
+    return {"descriptor": packet.descriptor, "args": packet.args, "return_data": packet.return_data,
+            "numerical": packet.numerical, "index": packet.index, "last_chunk": packet.last_chunk,
+            "timestamp": packet.timestamp.isoformat() if packet.timestamp is not None else None, **extra}
+
+
+def _packet_from_record(record):
+    """
+    :param record: (dict) from _packet_record()
+    :return: (Packet) packet, as it was queued
+    """
+    packet = Packet(record["descriptor"], args=record["args"])
+    packet.return_data, packet.numerical, packet.index = record["return_data"], record["numerical"], record["index"]
+    packet.last_chunk = record.get("last_chunk", True)
+    if record["timestamp"] is not None: packet.timestamp = datetime.fromisoformat(record["timestamp"])
+    return packet
+
+
+def _sync_journal():
+    """
+    Syncs the journal at the end of a session. FSYNC_BATCH only syncs when a later record is written, so the last
+    adds and acks of a session, eg the ack of its final frame, would otherwise wait for the next one
+    """
+    global journal
+    if journal is not None and journal.fsync != FSYNC_NEVER: journal.sync()
+
+
+def _receive(packet):
+    """
+    Appends a decoded MT packet to received_queue, journaling it first
+    :param packet: (Packet) decoded packet
+    """
+    global journal, received_queue
+    if journal is not None: packet.journal_id = journal.append("rx", _packet_record(packet))
+    received_queue.append(packet)
+
+
+def append_to_queue(packet, priority=None, ttl=None):
     """
     Splits a packet, sets time of execution, and appends to the transmission queue
     To be called at execution time
     :param packet: (Packet) to split, process, and append
+    :param priority: (int) queue priority, lower is sent first. Defaults to the descriptor's DESCRIPTOR_PRIORITIES entry
+    :param ttl: (float) seconds before the packet is stale and dropped unsent, None to keep it until sent
+    Raises ValueError, queueing nothing, if the packet needs more than MAX_CHUNKS chunks
     """
-    global transmission_queue
-    data = packet.return_data
-    split_packet_list = [data[0 + i:(MAX_PACKET_SIZE-HEADER_SIZE)//FLOAT_LEN + i] for i in range(
-        0, len(data), (MAX_PACKET_SIZE-HEADER_SIZE)//FLOAT_LEN)]
-    result = [copy.deepcopy(packet) for _ in range(len(ls))]
-    for idx, packet in enumerate(split_packet_list): result[idx].return_data, result[idx].index = packet, idx
-    for packet in result[::-1]: transmission_queue += [packet]
+    global transmission_queue, DESCRIPTOR_PRIORITIES, journal, MAX_CHUNKS
+    chunks = []
+    for chunk in _chunks(packet):
+        if len(chunks) == MAX_CHUNKS: raise ValueError(f"{packet.descriptor} needs more than {MAX_CHUNKS} chunks, split it")
+        chunks.append(chunk)
+    if priority is None: priority = DESCRIPTOR_PRIORITIES.get(packet.descriptor, DEFAULT_PRIORITY)
+    deadline = transmission_queue.clock() + ttl if ttl is not None else None
+    for chunk in chunks:
+        if journal is not None:
+            chunk.journal_id = journal.append("tx", _packet_record(chunk, priority=priority,
+                                                                  expires=time.time() + ttl if ttl is not None else None))
+        transmission_queue.push(chunk, priority, deadline)
+
+
+def _chunks(packet):
+    """
+    Splits a packet into chunks that each encode into one record, lazily
+    Chunk sizes come from one codec.size_estimate of the whole packet, each chunk is encoded once to confirm it fits
+    :param packet: (Packet) packet to split
+    :return: (generator) PacketChunks in index order, each a view of packet's data
+    """
+    global DESCRIPTOR_ENCODINGS
+    data, budget, start, index = packet.return_data, MAX_PACKET_SIZE - RECORD_HEADER_SIZE - HEADER_SIZE, 0, 0
+    encoding = DESCRIPTOR_ENCODINGS.get(packet.descriptor)
+    estimate = codec.size_estimate(data, encoding) if packet.numerical and len(data) else None
+    while start < len(data) or index == 0:
+        size = max(codec.fit(data, budget, encoding, start, estimate) if packet.numerical else budget, 1)
+        yield PacketChunk(packet, index, start, min(start + size, len(data)))
+        start, index = start + size, index + 1
 
 
 def peek_command_queue():
@@ -71,43 +217,84 @@ def pop_command_queue():
     Removes and returns first packet in queue
     """
     global received_queue
-    return received_queue.pop(0)
+    packet = received_queue.pop(0)
+    _acknowledge(packet)
+    return packet
 
 
-def _encode(packet):
+def _build_frame(candidates=None):
+    """
+    Packs queued packets into one MO message. The head of the queue always goes first, then the next
+    FRAME_LOOKAHEAD packets are added first fit while they fit in MAX_PACKET_SIZE
+    Records are encoded straight into the reusable frame slot, a packet that doesn't fit what is left fails to encode.
+    The sub-header length is only known afterwards, so records under 32 bytes are moved back by the byte they don't
+    need. Against encoding each record into its own buffer and joining them this saves about two allocated blocks per
+    packet and no measurable time, see benchmarks/encode_alloc.py. pyserial still copies the frame when it is written
+    :param candidates: (list) packets to pack in order, the head of the transmission queue by default
+    :return: (tuple) frame as a memoryview of the slot, empty if the queue is, its checksum, and the packets it holds
     """
-    Encodes a packet to raw byte list. Does NOT consider packet length
+    global transmission_queue, MAX_PACKET_SIZE, FRAME_LOOKAHEAD, frame_slot
+    if candidates is None: candidates = transmission_queue.peek_many(FRAME_LOOKAHEAD + 1)
+    view, packed, offset, last = memoryview(frame_slot), [], 0, None
+    for packet in candidates:
+        start = offset + RECORD_HEADER_SIZE
+        try: end = _encode_into(packet, view, start, MAX_PACKET_SIZE)
+        except ValueError:
+            if packed: continue  # doesn't fit in what's left, try the next one
+            raise
+        header = codec.record_header(end - start, False, packet.last_chunk)
+        if len(header) < RECORD_HEADER_SIZE:  # short record, close the gap left for a longer sub-header
+            view[offset + len(header):end - RECORD_HEADER_SIZE + len(header)] = view[start:end]
+            end -= RECORD_HEADER_SIZE - len(header)
+        view[offset:offset + len(header)] = header
+        last, offset = (offset, end - offset - len(header), packet.last_chunk), end
+        packed.append(packet)
+        if MAX_PACKET_SIZE - offset <= HEADER_SIZE + RECORD_HEADER_SIZE: break
+    if last is not None:  # flag the last record, same sub-header length
+        final = codec.record_header(last[1], True, last[2])
+        view[last[0]:last[0] + len(final)] = final
+    frame = view[:offset]
+    return frame, sum(frame) & 0xffff, packed
+
+
+def _encode_into(packet, buffer, offset=0, end=None):
+    """
+    Encodes a packet straight into a buffer
+    Numeric data uses the descriptor's pinned encoding or the smallest codec encoding. Anything but FLOAT3 sets the
+    high bit of the first byte and adds an encoding byte after the 4 byte header
+    Text is deflated with TEXT_DICTIONARY when that makes it smaller, which also sets the high bit
     :param packet: (Packet) packet to encode
-    :return: (List) encoded data
+    :param buffer: (memoryview) writable destination
+    :param offset: (int) where the packet starts in buffer
+    :param end: (int) end of the space available, the end of buffer by default
+    :return: (int) offset just past the packet. Raises ValueError if it does not fit
     """
-    global ENCODED_REGISTRY
-    encoded_bytes_list = [(packet.index << 1) & 0x7f | packet.numerical] # First byte numerical/index
+    global DESCRIPTOR_IDS, DESCRIPTOR_ENCODINGS, TEXT_DICTIONARY
+    end = len(buffer) if end is None else end
+    if end - offset < HEADER_SIZE: raise ValueError("Packet does not fit")
     date = (packet.timestamp.day << 11) | (packet.timestamp.hour << 6) | packet.timestamp.minute  # second and third bytes date
-    encoded_bytes_list += [(date >> 8) & 0xff, date & 0xff, ENCODED_REGISTRY.index(packet.descriptor)]  # 1st date byte, 2nd date byte, 4th byte descriptor
+    buffer[offset] = (packet.index << 1) & 0x7f | packet.numerical  # First byte numerical/index
+    buffer[offset + 1], buffer[offset + 2] = (date >> 8) & 0xff, date & 0xff  # 1st date byte, 2nd date byte
+    buffer[offset + 3] = DESCRIPTOR_IDS[packet.descriptor]  # 4th byte descriptor
     if packet.numerical: # Encode float data if applicable
-        for n in packet.return_data:
-            #  convert from float or int to twos comp half precision, bytes are MSB FIRST
-            flt, exp = 0, int(math.floor(math.log10(abs(n)))) if n != 0 else 0
-            if exp < 0:
-                exp = (1 << 4) - (abs(exp) & 0xf) # make sure exp is 4 bits, cut off anything past the 4th, take abs val and twos comp
-                flt |= 1 << 23 # set sign bit
-            flt |= (exp & 0xf) << 19  # make sure exp is 4 bits, cut off anything past the 4th, shift left 19. Leaves sign untouched
-            # num will always have five digits, with trailing zeros if necessary to fill it in
-            num = abs(int((n / (10 ** exp)) * 10000))
-            if n < 0:
-                num = (1 << 18) - (num & 0x3ffff)  # make sure num is 18 bits long, then twos comp
-                flt |= (1 << 18)  # set sign bit
-            flt |= num & 0x3ffff  # make sure num is 18 bits long (in the positive case), leaves sign untouched
-            encoded_bytes_list += [(flt >> 16) & 0xff, (flt >> 8) & 0xff, flt & 0xff]  # MSB FIRST, ..., # LSB LAST
+        encoding, size = codec.encode_values_into(packet.return_data, buffer[offset + HEADER_SIZE:end],
+                                                  DESCRIPTOR_ENCODINGS.get(packet.descriptor))
+        if encoding != codec.FLOAT3: buffer[offset] |= 0x80  # high bit of the first byte flags an encoding byte after the header
     else:
         data = "".join(packet.return_data).encode("ascii")
-        encoded_bytes_list += data
-    return encoded
+        compressed = codec.compress_text(data, TEXT_DICTIONARY)
+        if compressed is not None: data, buffer[offset] = compressed, buffer[offset] | 0x80  # high bit flags compressed text
+        size = len(data)
+        if size > end - offset - HEADER_SIZE: raise ValueError("Packet does not fit")
+        buffer[offset + HEADER_SIZE:offset + HEADER_SIZE + size] = data
+    return offset + HEADER_SIZE + size
 
 
 def _decode(message):
     """
     Decodes processed SBDRB output and converts to packet
+    Payload is a command id byte, then its arguments as 3 byte floats. If the id's high bit is set an encoding
+    byte follows it and the arguments use that codec encoding instead
     :param message: (byte string) sbdrb output
     :return: (packet) output packet
     """
@@ -117,43 +304,248 @@ def _decode(message):
     msg = message[2:-2]
 
     if checksum != (sum(msg) & 0xffff) or length != len(msg): raise ValueError("Incorrect checksum/length")
-    if msg[0] < 0 or msg[0] >= len(ENCODED_REGISTRY): raise ValueError("Invalid command received")
-    command, args = ENCODED_REGISTRY[msg[0]], []
-    for i in range(1, len(msg) - 2, 3):
-        num = (msg[i] << 16) | (msg[i + 1] << 8) | (msg[i + 2])  # MSB first
-        exp = num >> 19  # extract exponent
-        if exp & (1 << 4) == 1: exp = (exp & 0x10) - (1 << 4)  # convert twos comp
-
-        coef = num & 0x7ffff  # extract coefficient
-        if coef & (1 << 18) == 1: coef = (coef & 0x3ffff) - (1 << 18)  # convert twos comp
-        if coef != 0: coef /= 10 ** int(math.log10(abs(coef)))
-        args += [coef * 10 ** exp]
+    command = ENCODED_REGISTRY.get(msg[0] & 0x7f)
+    if command is None: raise ValueError("Invalid command received")
+    if msg[0] & 0x80: args = codec.decode_values(msg[1], msg[2:]).tolist()
+    else: args = codec.decode_floats(msg[1:]).tolist()
     return Packet(command, args=args)
 
 
 def contact():
     """
     Transmits contents of transmission queue while reading in messages to received queue
+    Only runs an SBDIX session while there is something to send or MT messages are waiting at the GSS, and only when
+    the retry scheduler allows it. Use next_contact_in() to decide when to call this again
     """
     global iridium
-    # Check receive buffer
-    stat = iridium.sbd_status()
-    if stat[2] == 1: received_queue.append(_decode(iridium.read_mt())) # add error handling
-
-    # While signal, transmit and receive, and update buffers
-    while gpio.read_network_available():
-        if len(transmission_queue) > 0:
-            msg = _encode(transmission_queue[0])
-            iridium.load_mo(msg) # add error handling
-            transmission_queue.pop(0)
-        result = iridium.sbd_initiate_x() # add error handling
-        if result[0] not in {0, 1, 2, 3, 4}:
-            if result[0] in {10, 11, 12, 13, 14, 17, 18, 19, 32, 35, 36, 37, 38}: break  # no signal
-            else: raise ValueError(details=f"Error transmitting buffer, error code {result[0]}")  # hardware issue
-        
-        if result[2] == 1: received_queue.append(_decode(iridium.read_mt())) # add error handling
-        if (result[2] == 0 or result[2] == 2) and len(transmission_queue) == 0: break#issue: this will call sbdix one time more than necessary, rack up overcharges
-    iridium.clear_buffers()  #clear sbd buffers
+    with modem_lock:
+        # Check receive buffer
+        stat = iridium.sbd_status()
+        if stat[2] == 1: _receive(_decode(iridium.read_mt())) # add error handling
+
+        # While something to exchange and the scheduler sees enough signal, transmit and receive, and update buffers
+        mo_loaded = stat[0] == 1
+        transmission_queue.expire()  # stale packets shouldn't cause a session
+        while _session_needed() and scheduler.due():
+            if not scheduler.signal_ok(iridium.check_signal_passive() if gpio.wait_for_network(NETWORK_WAIT) else 0): break
+            msg, checksum, packed = _build_frame()
+            mo_bytes = len(msg)
+            if msg: load_latencies.append(iridium.load_mo(msg, checksum=checksum)) # add error handling
+            elif mo_loaded: iridium.clear_buffers(0)  # otherwise a receive-only session resends the last message
+            mo_loaded = mo_bytes > 0
+            result = iridium.sbd_initiate_x() # add error handling
+            _record_session(result, mo_bytes)
+            scheduler.record(result)
+            if _session_failed(result): break
+
+            for packet in packed:  # only dequeue once the MO status confirms the send
+                if transmission_queue.remove(packet): _acknowledge(packet)
+            if result[2] == 1: _receive(_decode(iridium.read_mt())) # add error handling
+        iridium.clear_buffers()  #clear sbd buffers
+    _sync_journal()
+
+
+async def contact_async():
+    """
+    Asyncio variant of contact(), for an AsyncIridium started with start(asynchronous=True)
+    Each modem wait yields to the event loop, so other tasks keep running during the session
+    """
+    global iridium
+    async with _async_modem_lock():
+        stat = await iridium.sbd_status()
+        if stat[2] == 1: _receive(_decode(await iridium.read_mt()))
+
+        mo_loaded = stat[0] == 1
+        transmission_queue.expire()  # stale packets shouldn't cause a session
+        while _session_needed() and scheduler.due():
+            if not scheduler.signal_ok(await iridium.check_signal_passive() if await gpio.wait_for_network_async(NETWORK_WAIT) else 0): break
+            msg, checksum, packed = _build_frame()
+            mo_bytes = len(msg)
+            if msg: load_latencies.append(await iridium.load_mo(msg, checksum=checksum))
+            elif mo_loaded: await iridium.clear_buffers(0)
+            mo_loaded = mo_bytes > 0
+            result = await iridium.sbd_initiate_x()
+            _record_session(result, mo_bytes)
+            scheduler.record(result)
+            if _session_failed(result): break
+
+            for packet in packed:
+                if transmission_queue.remove(packet): _acknowledge(packet)
+            if result[2] == 1: _receive(_decode(await iridium.read_mt()))
+        await iridium.clear_buffers()
+    _sync_journal()
+
+
+def enable_ring_alerts():
+    """
+    Turns on modem ring alerts and retrieves MT messages the moment the ring indicator fires, instead of waiting
+    for the next contact(). Retrieval runs on its own thread, the GPIO event thread only signals it
+    """
+    global iridium, ring_thread
+    with modem_lock: iridium.ring_alerts(True)
+    if ring_thread is None:
+        ring_thread = threading.Thread(target=_ring_worker, name="ring-alerts", daemon=True)
+        ring_thread.start()
+    gpio.on_ring(_on_ring)
+
+
+async def enable_ring_alerts_async():
+    """
+    enable_ring_alerts() for an AsyncIridium. The GPIO callback hands retrieval to the running event loop
+    """
+    global iridium
+    loop = asyncio.get_running_loop()
+    async with _async_modem_lock(): await iridium.ring_alerts(True)
+    gpio.on_ring(lambda channel: asyncio.run_coroutine_threadsafe(_on_ring_async(), loop))
+
+
+def disable_ring_alerts():
+    """
+    Stops reacting to the ring indicator. Ring alerts stay on in the modem, so MT queued is still reported by SBDIX
+    A retrieval already running finishes, the ring thread exits after it
+    """
+    global ring_thread, ring_pending
+    gpio.remove_ring_callback()
+    ring_thread = None
+    ring_pending.set()
+
+
+def _on_ring(channel):
+    """
+    Ring indicator callback, runs on the GPIO event thread, which also delivers NET_AVAIL edges. An SBDIXA can take
+    a minute, so it only wakes the ring thread and returns
+    :param channel: (int) GPIO pin that fired
+    """
+    global ring_pending
+    ring_pending.set()
+
+
+def _ring_worker():
+    """
+    Ring thread, retrieves MT messages each time the ring indicator fires until disable_ring_alerts()
+    If a contact is already running it will collect the message, it only needs to know there is one
+    """
+    global mt_queued, ring_pending
+    while True:
+        ring_pending.wait()
+        ring_pending.clear()
+        if ring_thread is not threading.current_thread(): return
+        if not modem_lock.acquire(blocking=False):
+            mt_queued = None
+            continue
+        try: _retrieve_mt()
+        except Exception: mt_queued = None  # modem or message error, leave the message for the next contact()
+        finally: modem_lock.release()
+        _sync_journal()
+
+
+def _retrieve_mt():
+    """
+    Drains MT messages into received_queue with SBDIXA sessions, which tell the GSS the session answers a ring alert
+    If the scheduler is backing off or a session fails the ring isn't served, MT queued is then unknown so the next
+    contact() checks the mailbox
+    """
+    global iridium, mt_queued
+    iridium.clear_buffers(0)  # an SBDIXA would also send whatever is in the MO buffer
+    while scheduler.due():
+        result = iridium.sbd_initiate_xa()
+        _record_session(result, 0)
+        scheduler.record(result)
+        if _session_failed(result): break
+        if result[2] == 1: _receive(_decode(iridium.read_mt()))
+        if result[5] == 0: return
+    mt_queued = None
+
+
+async def _on_ring_async():
+    """
+    _on_ring() and _retrieve_mt() for an AsyncIridium, runs as a task on the event loop
+    """
+    global iridium, mt_queued
+    lock = _async_modem_lock()
+    if lock.locked():
+        mt_queued = None
+        return
+    async with lock:
+        try:
+            await iridium.clear_buffers(0)
+            while scheduler.due():
+                result = await iridium.sbd_initiate_xa()
+                _record_session(result, 0)
+                scheduler.record(result)
+                if _session_failed(result): break
+                if result[2] == 1: _receive(_decode(await iridium.read_mt()))
+                if result[5] == 0: return
+            mt_queued = None
+        finally: _sync_journal()
+
+
+def _async_modem_lock():
+    """
+    :return: (asyncio.Lock) modem lock for asyncio callers, created on first use so it belongs to the running loop
+    """
+    global async_modem_lock
+    if async_modem_lock is None: async_modem_lock = asyncio.Lock()
+    return async_modem_lock
+
+
+def next_contact_in():
+    """
+    :return: (float) seconds until the retry scheduler will allow another session
+    """
+    global scheduler
+    return scheduler.wait_time()
+
+
+def _session_needed():
+    """
+    Session planner, decides whether another SBDIX session is worth its airtime
+    Sends while the transmission queue has packets, otherwise only drains MT messages the GSS says are queued.
+    With no count to go on (first contact, or the last one is older than MAILBOX_CHECK_INTERVAL) it checks the mailbox once
+    :return: (bool) whether to run a session
+    """
+    global transmission_queue, mt_queued, mt_queued_time, MAILBOX_CHECK_INTERVAL
+    if len(transmission_queue) > 0: return True
+    if mt_queued is None or time.monotonic() - mt_queued_time > MAILBOX_CHECK_INTERVAL: return True
+    return mt_queued > 0
+
+
+def _record_session(result, mo_bytes):
+    """
+    Updates the planner's MT queued count and the session statistics from an SBDIX result
+    :param result: (list) sbd_initiate_x output
+    :param mo_bytes: (int) size of the message loaded for this session, 0 if none
+    """
+    global mt_queued, mt_queued_time, session_stats
+    session_stats["sessions"] += 1
+    if result[0] not in MO_SUCCESS_CODES:
+        session_stats["failed_sessions"] += 1
+        return
+    session_stats["mo_bytes"] += mo_bytes
+    if result[2] == 1: session_stats["mt_bytes"] += result[4]
+    mt_queued, mt_queued_time = result[5], time.monotonic()
+
+
+def sessions_per_byte():
+    """
+    Cost metric for the session planner
+    :return: (float) SBDIX sessions run per byte delivered in either direction, None if nothing has been delivered
+    """
+    global session_stats
+    delivered = session_stats["mo_bytes"] + session_stats["mt_bytes"]
+    return session_stats["sessions"] / delivered if delivered else None
+
+
+def _session_failed(result):
+    """
+    Classifies an SBDIX result
+    :param result: (list) sbd_initiate_x output
+    :return: (bool) True if the session failed for lack of signal
+    """
+    if result[0] not in MO_SUCCESS_CODES:
+        if result[0] in NO_SIGNAL_CODES: return True  # no signal
+        else: raise ValueError(f"Error transmitting buffer, error code {result[0]}")  # hardware issue
+    return False
 
 
 def update_time():
@@ -162,28 +554,11 @@ def update_time():
     """
     global iridium, TIME_ERR_THRESHOLD
     current_datetime = datetime.utcnow()
-    time = iridium.network_time()
-    if time is not None and abs((current_datetime - iridium_datetime).total_seconds()) > TIME_ERR_THRESHOLD:
+    with modem_lock: iridium_datetime = iridium.network_time()
+    if iridium_datetime is not None and abs((current_datetime - iridium_datetime).total_seconds()) > TIME_ERR_THRESHOLD:
         os.system(f"sudo date -s \"{iridium_datetime.strftime('%Y-%m-%d %H:%M:%S UTC')}\" ")  # Update system time
         os.system("sudo hwclock -w")  # Write to RTC        
 
 def geolocation():
     global iridium
-    return iridium.geolocation() # add error handling
-    
-
-class Packet:
-    def __init__(self, descriptor, args=None, return_data=None):
-        self.descriptor = descriptor
-        self.args = args if args is not None else []
-        if return_data is None: self.return_data, self.numerical = [], 1
-        elif type(return_data) == list: self.numerical, self.return_data = 1, return_data
-        elif type(return_data) == str: self.numerical, self.return_data = 0, list(return_data)
-        else: ValueError(f"Invalid return data type of {type(return_data)} with data: {return_data}")
-        self.timestamp, self.index = None, 0
-
-    def __str__(self):
-        return f"{self.descriptor} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')}, index: {self.index}, numerical {self.numerical}: {self.return_data}"
-
-    def set_time(self):
-        self.timestamp = datetime.utcnow()
\ No newline at end of file
+    with modem_lock: return iridium.geolocation() # add error handling
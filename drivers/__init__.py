@@ -1,8 +0,0 @@
-import spidev
-import RPi.GPIO as gp 
-from smbus2 import SMBus
-import numpy as np
-from math import atan2, degrees
-from serial import Serial
-import time
-from datetime import datetime
\ No newline at end of file
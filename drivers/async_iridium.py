@@ -0,0 +1,308 @@
+# Asyncio Iridium 9602N Modem Driver
+# Same AT commands and parsing as drivers/iridium.py, but every wait on the modem yields to the event loop,
+# so watchdog kicks, ADC sampling and IMU polling keep running through a 60 second SBDIX session
+
+from serial import Serial
+import asyncio
+from datetime import timedelta
+from drivers.transcript import TraceHooks, PAYLOAD
+from drivers.iridium import QueryCache, LOAD_TIMEOUT, _final_result, _strip, _parse_network_time, _parse_geolocation, _parse_signal, \
+    _check_load_result
+
+
+class AsyncIridium(QueryCache, TraceHooks):
+    def __init__(self, port, baudrate, cache_ttl=None):
+        """
+        MUST be called after the modem is powered on
+        The port is opened non-blocking, reads are driven by the event loop watching its file descriptor
+        :param cache_ttl: (dict) query name to TTL in seconds, eg CACHE_TTL. Caching is off if omitted
+        Set .recorder to a drivers.transcript.TranscriptRecorder to time every command
+        """
+        self._init_cache(cache_ttl)
+        self.serial = Serial(port=port, baudrate=baudrate, timeout=0)  # connect serial, reads never block
+        self._buffer, self._trailing_ok = bytearray(), False
+        self._loop, self._data, self._lock = None, None, None
+
+
+    async def shutdown(self):
+        """
+        Calls AT*F and closes serial
+        """
+        await self._request("AT*F", 1)
+        self.close()
+
+
+    def close(self):
+        """
+        Stops watching the port and closes serial
+        """
+        if self._loop is not None and not self._loop.is_closed(): self._loop.remove_reader(self.serial.fileno())
+        self._loop = None
+        self.serial.close()
+
+
+    async def soft_reset(self):
+        """
+        Resets settings without a power cycle
+        """
+        await self._request("ATZn", 1)
+
+
+    async def sbd_status(self):
+        """
+        Calls AT+SBDS, see Iridium.sbd_status
+        :return: (list) SBD Status return
+        """
+        cached = self._cache_get("sbd_status")
+        if cached is not None: return list(cached[0])
+        status = [int(i) for i in (await self._process("AT+SBDS")).split(",")]
+        self._cache_put("sbd_status", tuple(status))
+        return status
+
+
+    async def read_mt(self, timeout=5):
+        """
+        Reads the MT buffer with AT+SBDRB, framed by the 2 byte length prefix, see Iridium.read_mt
+        :param timeout: (float) seconds before it gives up
+        :return: (bytes) length bytes, message, checksum bytes
+        """
+        def framed(buffer):
+            i = buffer.find(b"SBDRB\r") + 6
+            if i == 5 or len(buffer) < i + 2: return False
+            return len(buffer) >= i + ((buffer[i] << 8) | buffer[i + 1]) + 4
+
+        self.invalidate_cache("sbd_status")
+        async with self._session():
+            await self._write("AT+SBDRB")
+            raw = await self._read_until(framed, timeout)
+            if raw is None:
+                self._trace_end(self._buffer, None)
+                raise ValueError("Iridium Timeout")
+            start = raw.find(b"SBDRB\r") + 6
+            end = start + ((raw[start] << 8) | raw[start + 1]) + 4
+            self._trace_end(raw, "OK")
+            self._trailing_ok = raw[end:].find(b"OK") == -1
+            return raw[start:end]
+
+
+    async def load_mo(self, message, timeout=LOAD_TIMEOUT, checksum=None):
+        """
+        Loads message into mo buffer. The payload is written as soon as READY arrives
+        :param message: (bytes-like or list) raw byte message to send, bytes-like objects are passed to serial.write as they are, pyserial copies them to bytes
+        :param timeout: (float) seconds the whole load may take
+        :param checksum: (int) sum of the message bytes if the caller already has it
+        :return: (float) load latency in seconds, from SBDWB to the modem's status
+        """
+        if isinstance(message, list): message = bytes(message)
+        if checksum is None: checksum = sum(message)
+        checksum &= 0xffff
+        self.invalidate_cache("sbd_status")
+        async with self._session():
+            start = self._loop.time()
+            await self._write(f"AT+SBDWB={len(message)}")  # Specify bytes to write
+            result, code = await self._read_response(timeout)
+            if code == "OK": _check_load_result(result)  # rejected before READY, eg message too long
+            if code != "READY": raise ValueError("Iridium Timeout")
+            self._trace_start(PAYLOAD, len(message) + 2)
+            self.serial.write(message)  # payload, then checksum MSB first
+            self.serial.write(bytes((checksum >> 8, checksum & 0xff)))
+            result, code = await self._read_response(max(timeout - (self._loop.time() - start), 0))
+            if code != "OK": raise ValueError("Iridium Timeout")
+            _check_load_result(result)
+            return self._loop.time() - start
+
+
+    async def sbd_initiate_x(self):
+        """
+        AT+SBDIX call, see Iridium.sbd_initiate_x
+        :return: (list) SBDIX call result
+        """
+        self.invalidate_cache()
+        return [int(i) for i in (await self._process("AT+SBDIX", timeout=60)).split(",")]
+
+
+    async def sbd_initiate_xa(self):
+        """
+        AT+SBDIXA call, SBDIX in answer to a ring alert
+        :return: (list) SBDIXA call result
+        """
+        self.invalidate_cache()
+        return [int(i) for i in (await self._process("AT+SBDIXA", timeout=60)).split(",")]
+
+
+    async def ring_alerts(self, enable):
+        """
+        Calls AT+SBDMTA, enables or disables the ring indicator for MT messages
+        :param enable: (bool) whether the modem should ring
+        """
+        await self._request(f"AT+SBDMTA={int(enable)}")
+
+
+    async def clear_buffers(self, buffers=2):
+        """
+        Clears SBD buffers, see Iridium.clear_buffers
+        :param buffers: (int) 0: MO buffer, 1: MT buffer, 2: both
+        """
+        self.invalidate_cache("sbd_status")
+        await self._request(f"AT+SBDD{buffers}")
+
+
+    async def network_time(self):
+        """
+        Processed system time, GMT, retrieved from satellite network, see Iridium.network_time
+        :return: (datetime) current time, None if there is no network service
+        """
+        cached = self._cache_get("network_time")
+        if cached is not None: return cached[0] + timedelta(seconds=cached[1])
+        network_time = _parse_network_time(await self._request("AT-MSSTM"))
+        self._cache_put("network_time", network_time)
+        return network_time
+
+
+    async def geolocation(self):
+        """
+        Geolocation at time of last contact with iridium constellation, see Iridium.geolocation
+        :return: (tuple) lat, long, altitude, time (unix timestamp)
+        """
+        cached = self._cache_get("geolocation")
+        if cached is not None: return cached[0]
+        location = _parse_geolocation(await self._process("AT-MSGEO"))
+        self._cache_put("geolocation", location)
+        return location
+
+
+    async def register(self, location=None):
+        """
+        Performs a manual registration, see Iridium.register
+        :param location: (str) Optional location param, format [+|-]DDMM.MMM,[+|-]dddmm.mmm
+        :return: (str) raw processed result
+        """
+        self.invalidate_cache("geolocation")  # the location update gives a new fix
+        if location: return await self._process("AT+SBDREG", "=" + location)
+        else: return await self._process("AT+SBDREG")
+
+
+    async def check_signal_active(self):
+        """
+        Actively requests strength of satellite connection, may take up to ten seconds
+        :return: (int) CSQ from 0 (weakest) to 5 (strongest)
+        """
+        return _parse_signal(await self._request("AT+CSQ", 10), "CSQ:")
+
+
+    async def check_signal_passive(self):
+        """
+        Passively check signal strength, updates every 40 seconds by default
+        :return: (int) last known CSQ from 0 (weakest) to 5 (strongest)
+        """
+        cached = self._cache_get("check_signal_passive")
+        if cached is not None: return cached[0]
+        signal = _parse_signal(await self._request("AT+CSQF"), "CSQF:")
+        self._cache_put("check_signal_passive", signal)
+        return signal
+
+
+    async def _process(self, cmd, arg="", timeout=0.5):
+        """
+        Clean up data string
+        :param cmd: (str) command, including AT+ or AT- prefix
+        :param arg: (str) argument
+        :param timeout: (float) seconds before it gives up
+        """
+        return _strip(cmd, await self._request(cmd + arg, timeout))
+
+
+    async def _request(self, command: str, timeout=0.5):
+        """
+        Requests information from Iridium and returns unprocessed response
+        :param command: Command to send
+        :param timeout: maximum time to wait for a response
+        :return: (str) Response from Iridium
+        """
+        async with self._session():
+            await self._write(command)
+            result, code = await self._read_response(timeout)
+        if code == "ERROR": return command[2:] + "ERROR" + "\n"  # formatted so that process() can still decode properly
+        if code is not None: return result
+        raise ValueError("Iridium Timeout")
+
+
+    def _session(self):
+        """
+        Attaches to the running loop on first use
+        :return: (asyncio.Lock) held for the whole of one command, so tasks sharing the modem don't interleave
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._loop is not None and not self._loop.is_closed(): self._loop.remove_reader(self.serial.fileno())
+            self._loop, self._data, self._lock = loop, asyncio.Event(), asyncio.Lock()
+            loop.add_reader(self.serial.fileno(), self._on_readable)
+        return self._lock
+
+
+    def _on_readable(self):
+        """
+        Event loop callback, moves everything the port has into the buffer
+        """
+        data = self.serial.read(self.serial.in_waiting or 1)
+        if data:
+            self._trace_data()
+            self._buffer += data
+            self._data.set()
+
+
+    async def _write(self, command: str):
+        """
+        Write a command to the serial port, discarding any stale input first
+        :param command: (str) Command to write
+        """
+        if self._trailing_ok:
+            self._trailing_ok = False
+            await self._read_response()
+        self.serial.reset_input_buffer()
+        self._buffer.clear()
+        self._trace_start(command, len(command) + 1)
+        self.serial.write((command + "\r").encode("utf-8"))
+
+
+    async def _read_until(self, done, timeout):
+        """
+        Waits for the buffer to satisfy a condition
+        :param done: (callable) takes the buffer, returns True once enough has arrived
+        :param timeout: (float) seconds before it gives up
+        :return: (bytes) buffer contents, consumed, or None on timeout
+        """
+        deadline = self._loop.time() + timeout
+        while not done(self._buffer):
+            remaining = deadline - self._loop.time()
+            if remaining <= 0: return None
+            self._data.clear()
+            try: await asyncio.wait_for(self._data.wait(), remaining)
+            except asyncio.TimeoutError: pass
+        output = bytes(self._buffer)
+        self._buffer.clear()
+        return output
+
+
+    async def _read_response(self, timeout=0.5):
+        """
+        Reads until a final result code line (OK, ERROR, READY or an SBDIX result) or until timeout expires
+        :param timeout: (float) seconds before it gives up
+        :return: (tuple) string read from iridium, final result code or None on timeout
+        """
+        found = []
+        def final(buffer):
+            end = buffer.rfind(b"\n") + 1
+            code = _final_result(buffer, 0, end) if end else None
+            if code is not None: found.append(code)
+            return code is not None
+
+        output = await self._read_until(final, timeout)
+        if output is None:
+            output = bytes(self._buffer)
+            self._buffer.clear()
+            self._trace_end(output, None)
+            return output.decode("utf-8"), None
+        if found[0] == "SBDIX": self._trailing_ok = not output.rstrip().endswith(b"OK")
+        self._trace_end(output, found[0])
+        return output.decode("utf-8"), found[0]
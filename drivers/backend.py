@@ -0,0 +1,72 @@
+# Hardware backend selection
+# drivers/gpio.py and drivers/imu.py get their GPIO, SPI and I2C objects from here instead of importing RPi.GPIO,
+# spidev and smbus2 themselves, so the flight code imports anywhere. The backend is chosen once at startup from the
+# PIRIDIUM_BACKEND environment variable: "hardware" (default) for the Pi, "sim" for the simulators in sim/
+# The real modules are only imported when a device is first opened
+
+import os
+
+HARDWARE, SIM = "hardware", "sim"
+BACKEND_ENV = "PIRIDIUM_BACKEND"
+
+name = None  # backend in use, see select()
+options = {}  # simulator settings given to select()
+_gpio = None  # shared GPIO module or SimGPIO, every caller must see the same pin state
+
+
+def select(backend=None, **sim_options):
+    """
+    Chooses the backend, called on import with the environment's choice. Call again before gpio.start() or any IMU
+    is created to override it, eg from a benchmark
+    :param backend: (str) HARDWARE or SIM, PIRIDIUM_BACKEND or HARDWARE if omitted
+    :param sim_options: simulator settings, ignored on hardware
+        spi_latency, i2c_latency: (float) seconds per bus transaction
+        waveforms: (dict) MCP3208 channel to volts or a callable of time, see sim.spi.SimSpi
+        adc_noise: (float) volts of noise on every conversion
+        imu: (dict) further sim.smbus.SimSMBus keyword arguments
+    """
+    global name, options, _gpio
+    backend = backend or os.environ.get(BACKEND_ENV) or HARDWARE
+    if backend not in (HARDWARE, SIM): raise ValueError(f"Unknown backend {backend}, {BACKEND_ENV} must be {HARDWARE} or {SIM}")
+    name, options, _gpio = backend, sim_options, None
+
+
+def gpio():
+    """
+    :return: RPi.GPIO, or a shared sim.gpio.SimGPIO whose drive() and pulse() play the hardware side of input pins
+    """
+    global _gpio
+    if _gpio is not None: return _gpio
+    if name == SIM:
+        from sim.gpio import SimGPIO
+        _gpio = SimGPIO()
+    else:
+        import RPi.GPIO
+        _gpio = RPi.GPIO
+    return _gpio
+
+
+def spi():
+    """
+    :return: (SpiDev) unopened SPI device, a sim.spi.SimSpi with an MCP3208 on the sim backend
+    """
+    if name == SIM:
+        from sim.spi import SimSpi
+        return SimSpi(options.get("waveforms"), options.get("adc_noise", 0.002), options.get("spi_latency", 0.0))
+    from spidev import SpiDev
+    return SpiDev()
+
+
+def smbus(bus):
+    """
+    :param bus: (int) I2C bus number
+    :return: (SMBus) open bus, a sim.smbus.SimSMBus with a BNO055 on the sim backend
+    """
+    if name == SIM:
+        from sim.smbus import SimSMBus
+        return SimSMBus(bus, latency=options.get("i2c_latency", 0.0), **options.get("imu", {}))
+    from smbus2 import SMBus
+    return SMBus(bus)
+
+
+select()
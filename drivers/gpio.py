@@ -1,11 +1,13 @@
 # GPIO wrapper driver, with both GPIO and ADC
 
-from spidev import SpiDev
-import RPi.GPIO as gp
-import time
+from drivers import backend
+import numpy as np
+from collections import deque
+import asyncio, threading, time
 
 global ADC_VREF, HANDSHAKE, MODEM_ON_OFF, RING_INDICATOR, NET_AVAIL, \
-    PAYLOAD_PWR, PAYLOAD_GPIO, GPIO_INITIALIZED, PAYLOAD_GPIO_MODE, spibus
+    PAYLOAD_PWR, PAYLOAD_GPIO, GPIO_INITIALIZED, PAYLOAD_GPIO_MODE, RING_BOUNCE, spibus, gp, \
+    ADC_GAINS, POWER_CHANNELS, POWER_FIELDS, EDGE_HISTORY, DUTY_HOURS
 ADC_VREF = 3
 HANDSHAKE = 21 # Watchdog reset handshake
 MODEM_ON_OFF = 20 # Modem power control
@@ -14,17 +16,34 @@ NET_AVAIL = 12 # Modem net availability indicator
 PAYLOAD_PWR = 26 # Payload power control
 PAYLOAD_GPIO = 19 # Payload GPIO pin
 
+RING_BOUNCE = 200 # ms, the modem repeats the ring pulse
+EDGE_HISTORY = 256 # transitions kept per watched pin
+DUTY_HOURS = 24 # hours of NET_AVAIL duty cycle kept
+
+ADC_GAINS = np.array([1 / 0.4, 8.5, 1 / 0.4, 8.5, 3, 1 / 0.4, 1 / 0.4, 1]) # Volts at the ADC to engineering units, per channel
+POWER_CHANNELS = (0, 1, 2, 3, 4, 5, 6)
+POWER_FIELDS = ("solar_i_1", "solar_v_1", "solar_i_2", "solar_v_2", "battery_v", "battery_i", "payload_i")
+
 GPIO_INITIALIZED = False
 PAYLOAD_GPIO_MODE = 0
 
 spibus = None
+gp = None # RPi.GPIO or its simulator, from drivers.backend at start()
+
+_edge_lock = threading.Lock()
+_watches = {} # pin to {"edge", "callbacks", "history" of (time, level)}, see watch_edges()
+_net_up = threading.Event() # set while NET_AVAIL is high
+_net_waiters = [] # (loop, future) of wait_for_network_async() callers
+_net_duty = deque(maxlen=DUTY_HOURS) # [hour start, seconds up, seconds observed] per hour, time.time() based
+_net_accounted = None # time up to which _net_duty is counted
 
 def start():
-    global GPIO_INITIALIZED, spibus, HANDSHAKE, MODEM_ON_OFF, RING_INDICATOR, NET_AVAIL, PAYLOAD_PWR, PAYLOAD_GPIO_MODE
+    global GPIO_INITIALIZED, spibus, gp, HANDSHAKE, MODEM_ON_OFF, RING_INDICATOR, NET_AVAIL, PAYLOAD_PWR, PAYLOAD_GPIO_MODE
     if GPIO_INITIALIZED:
         raise Warning("GPIO Already Initialized!")
     else:
-        spibus = SpiDev()
+        if gp is None: gp = backend.gpio()
+        spibus = backend.spi()
         spibus.open(0, 0)
         spibus.max_speed_hz = 500000
         spibus.mode = 0b00
@@ -40,6 +59,8 @@ def start():
         PAYLOAD_GPIO_MODE = 0 # Initialize with gpio set to input
         GPIO_INITIALIZED = True
         set_gpio_mode(0)
+        watch_edges(NET_AVAIL, gp.BOTH)
+        watch_edges(RING_INDICATOR, gp.FALLING, RING_BOUNCE) # RI is active low
         
 def check_initialized(func):
     """
@@ -92,6 +113,148 @@ def read_ring_indicator():
     global RING_INDICATOR
     return gp.input(RING_INDICATOR)
 
+@check_initialized
+def on_ring(callback):
+    """
+    Registers an edge callback on the ring indicator, replacing any previous one
+    The callback runs on the GPIO library's event thread, not the caller's
+    :param callback: (callable) takes the channel that fired
+    """
+    global RING_INDICATOR
+    with _edge_lock: _watches[RING_INDICATOR]["callbacks"] = [callback]
+
+@check_initialized
+def remove_ring_callback():
+    """
+    Stops calling the ring callback, ring edges are still recorded in edge_history()
+    """
+    global RING_INDICATOR
+    with _edge_lock: _watches[RING_INDICATOR]["callbacks"] = []
+
+@check_initialized
+def watch_edges(pin, edge, bouncetime=None):
+    """
+    Starts recording transitions on an input pin, start() watches NET_AVAIL and RING_INDICATOR
+    :param pin: (int) BCM input pin, not already watched
+    :param edge: (int) gp.RISING, gp.FALLING or gp.BOTH. With BOTH the level is read when the callback runs, so
+    pulses shorter than the callback latency should be watched on one edge
+    :param bouncetime: (int) ms, edges closer together than this are ignored
+    """
+    with _edge_lock:
+        if pin in _watches: raise Warning(f"GPIO {pin} already watched")
+        level = gp.input(pin)
+        _watches[pin] = {"edge": edge, "callbacks": [], "history": deque([(time.time(), level)], maxlen=EDGE_HISTORY)}
+        if pin == NET_AVAIL: _net_edge(time.time(), level)
+    if bouncetime: gp.add_event_detect(pin, edge, callback=_on_edge, bouncetime=bouncetime)
+    else: gp.add_event_detect(pin, edge, callback=_on_edge)
+
+@check_initialized
+def add_edge_callback(pin, callback):
+    """
+    :param pin: (int) watched pin
+    :param callback: (callable) takes the channel that fired, runs on the GPIO library's event thread
+    """
+    with _edge_lock: _watches[pin]["callbacks"].append(callback)
+
+@check_initialized
+def remove_edge_callback(pin, callback):
+    with _edge_lock: _watches[pin]["callbacks"].remove(callback)
+
+@check_initialized
+def edge_history(pin):
+    """
+    :param pin: (int) watched pin
+    :return: (list) (time.time(), level) for the last EDGE_HISTORY transitions, oldest first, starting with the level
+    when watching began
+    """
+    with _edge_lock: return list(_watches[pin]["history"])
+
+@check_initialized
+def wait_for_network(timeout=None):
+    """
+    Blocks until NET_AVAIL is high, without polling
+    :param timeout: (float) seconds, None to wait indefinitely
+    :return: (bool) True if the network is available, False on timeout
+    """
+    return _net_up.wait(timeout)
+
+@check_initialized
+async def wait_for_network_async(timeout=None):
+    """
+    wait_for_network() for asyncio callers, the event loop keeps running meanwhile
+    :param timeout: (float) seconds, None to wait indefinitely
+    :return: (bool) True if the network is available, False on timeout
+    """
+    if _net_up.is_set(): return True
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    with _edge_lock:
+        if _net_up.is_set(): return True
+        _net_waiters.append((loop, future))
+    try:
+        await asyncio.wait_for(future, timeout)
+        return True
+    except asyncio.TimeoutError: return False
+    finally:
+        with _edge_lock:
+            if (loop, future) in _net_waiters: _net_waiters.remove((loop, future))
+
+@check_initialized
+def network_duty_cycle():
+    """
+    :return: (list) (hour start as a unix timestamp, fraction of the observed part of that hour NET_AVAIL was high)
+    for up to the last DUTY_HOURS hours, oldest first, the current hour included
+    """
+    with _edge_lock:
+        _net_account(time.time())
+        return [(hour, up / observed if observed else 0.0) for hour, up, observed in _net_duty]
+
+def _on_edge(channel):
+    """
+    Edge detect callback for every watched pin, records the transition then runs the pin's callbacks
+    """
+    now = time.time()
+    watch = _watches.get(channel)
+    if watch is None: return
+    level = gp.input(channel) if watch["edge"] == gp.BOTH else int(watch["edge"] == gp.RISING)
+    with _edge_lock:
+        if watch["edge"] == gp.BOTH and watch["history"][-1][1] == level: return  # other edge of a glitch we missed
+        watch["history"].append((now, level))
+        if channel == NET_AVAIL: _net_edge(now, level)
+        callbacks = list(watch["callbacks"])
+    for callback in callbacks: callback(channel)
+
+def _net_edge(now, level):
+    """
+    Tracks NET_AVAIL state for waiters and the duty cycle. Edge lock must be held
+    """
+    global _net_waiters
+    _net_account(now)
+    if not level:
+        _net_up.clear()
+        return
+    _net_up.set()
+    for loop, future in _net_waiters:
+        try: loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(True))
+        except RuntimeError: pass  # loop closed
+    _net_waiters = []
+
+def _net_account(now):
+    """
+    Adds the time since the last call to the hourly duty cycle, at the current NET_AVAIL state. Edge lock must be held
+    """
+    global _net_accounted
+    if _net_accounted is None: _net_accounted = now
+    t = max(_net_accounted, now - DUTY_HOURS * 3600) # clock jumps forward don't backfill more than is kept
+    while t < now:
+        hour = t - t % 3600
+        end = min(now, hour + 3600)
+        if not _net_duty or _net_duty[-1][0] != hour: _net_duty.append([hour, 0.0, 0.0])
+        _net_duty[-1][2] += end - t
+        if _net_up.is_set(): _net_duty[-1][1] += end - t
+        t = end
+    _net_accounted = max(_net_accounted, now)
+
 @check_initialized
 def read_network_available():
     global NET_AVAIL
@@ -165,4 +328,17 @@ def battery_i():
 
 @check_initialized
 def payload_i():
-    return _sample(6) / 0.4
\ No newline at end of file
+    return _sample(6) / 0.4
+
+@check_initialized
+def scan_adc(channels=POWER_CHANNELS):
+    """
+    Reads several ADC channels in one call, scaled to engineering units like solar_i_1() and friends
+    A convenience for the sampler and power statistics, each channel is still one _sample() transfer so it is no
+    faster than calling the single channel readers
+    :param channels: (sequence) ADC channels, from 0 to 7 inclusive
+    :return: (np.ndarray) engineering values, in the order of channels
+    """
+    global ADC_GAINS
+    channels = list(channels)
+    return np.array([_sample(c) for c in channels], dtype=np.float64) * ADC_GAINS[channels]
@@ -14,7 +14,7 @@ inertial measurement unit module with sensor fusion.
 * Adafruit `9-DOF Absolute Orientation IMU Fusion Breakout - BNO055
   <https://www.adafruit.com/product/4646>`_ (Product ID: 4646)
 """
-from smbus2 import SMBus
+from drivers import backend
 import time
 import numpy as np
 from math import atan2
@@ -816,7 +816,7 @@ class IMU_I2C(IMU):
     def __init__(self, addr=0x28):
         self.buffer = bytearray(2)
         self.address = addr
-        self.bus = SMBus(1)
+        self.bus = backend.smbus(1)
 
     def _write_register(self, register, value):
         self.buffer[0] = register
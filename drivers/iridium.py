@@ -1,8 +1,9 @@
 # Iridium 9602N Modem Driver
 
 from serial import Serial
+from drivers.transcript import TraceHooks, PAYLOAD
 import time, math
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # https://www.beamcommunications.com/document/328-iridium-isu-at-command-reference-v5
 # https://docs.rockblock.rock7.com/reference/sbdwt
@@ -26,12 +27,155 @@ LOAD_MSG_ERRORS = { 1: "Iridium Timeout",
                     2: "Incorrect Checksum",
                     3: "Message too long" }
 
-class Iridium:
-    def __init__(self, port, baudrate):
+# SBDIX MO status classes. Anything in neither set is a hardware or provisioning fault
+MO_SUCCESS_CODES = {0, 1, 2, 3, 4}
+NO_SIGNAL_CODES = {10, 11, 12, 13, 14, 17, 18, 19, 32, 35, 36, 37, 38}
+
+# Seconds a cached query result stays good, None to keep it until the next SBDIX session
+# CSQF only updates every 40 s, MSGEO only changes when the modem talks to the constellation, and network time
+# is extrapolated from the cached reading with the monotonic clock
+CACHE_TTL = { "check_signal_passive": 40,
+              "geolocation": None,
+              "network_time": 600,
+              "sbd_status": 60 }
+
+LOAD_TIMEOUT = 5  # Ceiling on an SBDWB load, from command to status
+READ_TIMEOUT = 0.05  # Serial timeout, bounds how long a single read blocks while waiting for the rest of a line
+
+# Lines that end a response. SBDIX results are final as far as we care, the trailing OK is consumed by the next _write
+FINAL_RESULT_CODES = {b"OK", b"ERROR", b"READY"}
+FINAL_RESULT_PREFIXES = (b"+SBDIX:", b"+SBDIXA:")
+
+
+def _final_result(buffer, start, end):
+    """
+    Scans complete lines of a response buffer for a final result code
+    :param buffer: (bytearray) raw response
+    :param start: (int) index of the first line not yet scanned
+    :param end: (int) index one past the last newline in the buffer
+    :return: (str) final result code, or None if there isn't one yet
+    """
+    for line in bytes(buffer[start:end]).split(b"\n"):
+        line = line.strip()
+        if line in FINAL_RESULT_CODES: return line.decode("utf-8")
+        if line.startswith(FINAL_RESULT_PREFIXES): return "SBDIX"
+    return None
+
+
+def _strip(cmd, data):
+    """
+    Cleans up a response down to the text after the command's name
+    :param cmd: (str) command, including AT+ or AT- prefix
+    :param data: (str) raw response
+    :return: (str) processed response
+    """
+    return data.split(cmd[3:] + ":")[1].split("\r\nOK")[0].strip()
+
+
+def _parse_network_time(raw):
+    """
+    :param raw: (str) raw MSSTM response
+    :return: (datetime) network time, None if there is no network service
+    """
+    if raw.find("OK") != -1 and raw.find("no network service") == -1:
+        raw = raw.split("MSSTM:")[1].split("\n")[0].strip()
+        return datetime.fromtimestamp(int(raw, 16) * 90 / 1000 + EPOCH)
+
+
+def _parse_geolocation(processed):
+    """
+    :param processed: (str) processed MSGEO response
+    :return: (tuple) lat, long, altitude, time (unix timestamp)
+    """
+    raw = processed.split(",")  # raw x, y, z, timestamp
+    location_timestamp = int(raw[3], 16) * 90 / 1000 + EPOCH
+    # Convert XYZ cartesian to latitude, longitude, altitude
+    lon = math.degrees(math.atan2(float(raw[1]), float(raw[0])))
+    lat = math.degrees(math.atan2(float(raw[2]), ((float(raw[1]) ** 2 + float(raw[0]) ** 2) ** 0.5)))
+    alt = (float(raw[0]) ** 2 + float(raw[1]) ** 2 + float(raw[2]) ** 2) ** 0.5
+    return lat, lon, alt, location_timestamp
+
+
+def _check_load_result(result):
+    """
+    Raises if an SBDWB write was rejected
+    :param result: (str) response to the binary write, '\r\n0\r\n\r\nOK\r\n' format
+    """
+    i = int(result.split("\r\n")[1])
+    if i in LOAD_MSG_ERRORS: raise ValueError(LOAD_MSG_ERRORS[i])
+
+
+def _parse_signal(raw, tag):
+    """
+    :param raw: (str) raw CSQ or CSQF response
+    :param tag: (str) "CSQ:" or "CSQF:"
+    :return: (int) CSQ from 0 (weakest) to 5 (strongest), 0 if the response has none
+    """
+    if raw.find(tag) == -1: return 0
+    return int(raw[raw.find(tag) + len(tag): raw.find(tag) + len(tag) + 1])
+
+
+class QueryCache:
+    """
+    Optional TTL cache for slow-changing modem queries, shared by Iridium and AsyncIridium
+    Queries without a TTL are never cached
+    """
+    def _init_cache(self, cache_ttl):
+        """
+        :param cache_ttl: (dict) query name to TTL in seconds, see CACHE_TTL. None or empty disables caching
+        """
+        self.cache_ttl = dict(cache_ttl) if cache_ttl else {}
+        self._cache = {}
+        self.cache_hits, self.cache_misses = dict.fromkeys(self.cache_ttl, 0), dict.fromkeys(self.cache_ttl, 0)
+
+    def _cache_get(self, name):
+        """
+        :param name: (str) query name
+        :return: (tuple) cached value and its age in seconds, or None on a miss or if the query isn't cached
+        """
+        if name not in self.cache_ttl: return None
+        entry, ttl = self._cache.get(name), self.cache_ttl[name]
+        if entry is not None:
+            age = time.monotonic() - entry[1]
+            if ttl is None or age < ttl:
+                self.cache_hits[name] += 1
+                return entry[0], age
+        self.cache_misses[name] += 1
+        return None
+
+    def _cache_put(self, name, value):
+        """
+        :param name: (str) query name
+        :param value: result to cache, None results are not cached
+        """
+        if name in self.cache_ttl and value is not None: self._cache[name] = (value, time.monotonic())
+
+    def invalidate_cache(self, name=None):
+        """
+        Drops cached results. Called after every SBDIX session, since it refreshes signal, location and buffers
+        :param name: (str) query to drop, None for all of them
+        """
+        if name is None: self._cache.clear()
+        else: self._cache.pop(name, None)
+
+    def cache_stats(self):
+        """
+        :return: (dict) query name to {"hits", "misses"}
+        """
+        return {name: {"hits": self.cache_hits[name], "misses": self.cache_misses[name]} for name in self.cache_ttl}
+
+
+class Iridium(QueryCache, TraceHooks):
+    _trailing_ok = False  # Set when a response was returned before the OK that follows it, eg on its SBDIX line
+
+    def __init__(self, port, baudrate, cache_ttl=None):
         """
         MUST be called after the modem is powered on
+        :param cache_ttl: (dict) query name to TTL in seconds, eg CACHE_TTL. Caching is off if omitted
+        Set .recorder to a drivers.transcript.TranscriptRecorder to time every command
         """
-        self.serial = Serial(port=port, baudrate=baudrate, timeout=1)  # connect serial
+        self._init_cache(cache_ttl)
+        self.serial = Serial(port=port, baudrate=baudrate, timeout=READ_TIMEOUT)  # connect serial
         while not self.serial.is_open:
             time.sleep(0.5)
 
@@ -61,44 +205,63 @@ class Iridium:
         MTMSN: sequence number in the next mobile terminated SBD session, -1 if nothing in the MT buffer
         :return: (list) SBD Status return
         """
-        return [int(i) for i in self._process("AT+SBDS").split(",")]
+        cached = self._cache_get("sbd_status")
+        if cached is not None: return list(cached[0])
+        status = [int(i) for i in self._process("AT+SBDS").split(",")]
+        self._cache_put("sbd_status", tuple(status))
+        return status
 
 
-    def read_mt(self):
+    def read_mt(self, timeout=5):
         """
-        Checks buffer for existing messages
-        Doesnt use request because we don't to decode as utf-8
-        :return: (list) raw list of bytes
+        Reads the MT buffer with AT+SBDRB
+        Response is the echo, a 2 byte length, the message, a 2 byte checksum, then OK. The length prefix says exactly
+        how many bytes follow, so message bytes that happen to spell OK can't cut the read short
+        :param timeout: (float) seconds before it gives up
+        :return: (bytes) length bytes, message, checksum bytes
         """
+        deadline = time.perf_counter() + timeout
+        self.invalidate_cache("sbd_status")
         self._write("AT+SBDRB")
-        raw = self.serial.read(50)
-        t = time.perf_counter()
-        while raw.find(b'OK') == -1:
-            if time.perf_counter() - t > 5: raise ValueError("Iridium Timeout")
-            raw += self.serial.read(50)
-        return list(raw[raw.find(b'SBDRB') + 6:].split(b'\r\nOK')[0])
-
-
-    def load_mo(self, message):
+        echo = bytearray()
+        while not echo.endswith(b"SBDRB\r"):
+            if time.perf_counter() > deadline:
+                self._trace_end(echo, None)
+                raise ValueError("Iridium Timeout")
+            echo += self.serial.read_until(b"SBDRB\r")
+            if echo: self._trace_data()
+        message = self._read_exact(2, deadline)
+        message += self._read_exact(((message[0] << 8) | message[1]) + 2, deadline)  # message and checksum in one read
+        self._trace_end(echo + message, "OK")
+        self._trailing_ok = True
+        return bytes(message)
+
+
+    def load_mo(self, message, timeout=LOAD_TIMEOUT, checksum=None):
         """
         Loads message into mo buffer
-        :param message: (list) raw byte message to send
-        """
-        length = len(message)
-        checksum = sum(message) & 0xffff
-        message.append(checksum >> 8)  # add checksum bytes
-        message.append(checksum & 0xff)
-        self._write(f"AT+SBDWB={length}")  # Specify bytes to write
-        time.sleep(1)  # 1 second to respond
-        if self._read().find("READY") == -1: raise ValueError("Iridium Timeout")
+        The payload is written the moment READY arrives and the status is parsed the moment it lands
+        :param message: (bytes-like or list) raw byte message to send, bytes-like objects are passed to serial.write as they are, pyserial copies them to bytes
+        :param timeout: (float) seconds the whole load may take
+        :param checksum: (int) sum of the message bytes if the caller already has it
+        :return: (float) load latency in seconds, from SBDWB to the modem's status
+        """
+        start = time.perf_counter()
+        if isinstance(message, list): message = bytes(message)
+        if checksum is None: checksum = sum(message)
+        checksum &= 0xffff
+        self.invalidate_cache("sbd_status")
+        self._write(f"AT+SBDWB={len(message)}")  # Specify bytes to write
+        result, code = self._read_response(timeout)
+        if code == "OK": _check_load_result(result)  # rejected before READY, eg message too long
+        if code != "READY": raise ValueError("Iridium Timeout")
+        self._trace_start(PAYLOAD, len(message) + 2)
         self.serial.write(message)  # Once "READY", write each byte, then the two LSB checksum bytes, MSB first
-        time.sleep(1)  # 1 second to respond
-        result, t = "", time.perf_counter()
-        while result.find("OK") == -1:
-            if time.perf_counter() - t > 5: raise ValueError("Iridium Timeout")
-            result += self._read()
-        i = int(result.split("\r\n")[1])  # '\r\n0\r\n\r\nOK\r\n' format
-        if i in LOAD_MSG_ERRORS: raise ValueError(LOAD_MSG_ERRORS[i])
+        self.serial.write(bytes((checksum >> 8, checksum & 0xff)))
+        result, code = self._read_response(max(timeout - (time.perf_counter() - start), 0))
+        if code != "OK": raise ValueError("Iridium Timeout")
+        _check_load_result(result)
+        return time.perf_counter() - start
 
 
     def sbd_initiate_x(self):
@@ -113,14 +276,34 @@ class Iridium:
         MT queued: number of MT messages in GSS waiting to be transferred to ISU
         :return: (list) SBDIX call result
         """
+        self.invalidate_cache()
         return [int(i) for i in self._process("AT+SBDIX", timeout=60).split(",")]
 
 
-    def clear_buffers(self):
+    def sbd_initiate_xa(self):
         """
-        Clears both SBD buffers
+        AT+SBDIXA call, SBDIX in answer to a ring alert. Same return format as sbd_initiate_x
+        :return: (list) SBDIXA call result
         """
-        self._request("AT+SBDD2")
+        self.invalidate_cache()
+        return [int(i) for i in self._process("AT+SBDIXA", timeout=60).split(",")]
+
+
+    def ring_alerts(self, enable):
+        """
+        Calls AT+SBDMTA, enables or disables the ring indicator for MT messages
+        :param enable: (bool) whether the modem should ring
+        """
+        self._request(f"AT+SBDMTA={int(enable)}")
+
+
+    def clear_buffers(self, buffers=2):
+        """
+        Clears SBD buffers. The MO buffer survives a successful SBDIX, so it must be cleared before a receive-only session
+        :param buffers: (int) 0: MO buffer, 1: MT buffer, 2: both
+        """
+        self.invalidate_cache("sbd_status")
+        self._request(f"AT+SBDD{buffers}")
 
 
     def network_time(self):
@@ -130,10 +313,11 @@ class Iridium:
         that have elapsed since the epoch
         :return: (datetime) current time (use str() to parse to string if needed)
         """
-        raw = self._request("AT-MSSTM")
-        if raw.find("OK") != -1 and raw.find("no network service") == -1:
-            raw = raw.split("MSSTM:")[1].split("\n")[0].strip()
-            return datetime.fromtimestamp(int(raw, 16) * 90 / 1000 + EPOCH)
+        cached = self._cache_get("network_time")
+        if cached is not None: return cached[0] + timedelta(seconds=cached[1])  # extrapolate from the cached reading
+        network_time = _parse_network_time(self._request("AT-MSSTM"))
+        self._cache_put("network_time", network_time)
+        return network_time
 
     def geolocation(self):
         """
@@ -143,13 +327,11 @@ class Iridium:
         Converts from cartesian to lat/long/alt
         :return: (tuple) lat, long, altitude, time (unix timestamp)
         """
-        raw = self._process("AT-MSGEO").split(",")  # raw x, y, z, timestamp
-        location_timestamp = int(raw[3], 16) * 90 / 1000 + EPOCH
-        # Convert XYZ cartesian to latitude, longitude, altitude
-        lon = math.degrees(math.atan2(float(raw[1]), float(raw[0])))
-        lat = math.degrees(math.atan2(float(raw[2]), ((float(raw[1]) ** 2 + float(raw[0]) ** 2) ** 0.5)))
-        alt = (float(raw[0]) ** 2 + float(raw[1]) ** 2 + float(raw[2]) ** 2) ** 0.5
-        return lat, lon, alt, location_timestamp
+        cached = self._cache_get("geolocation")
+        if cached is not None: return cached[0]
+        location = _parse_geolocation(self._process("AT-MSGEO"))
+        self._cache_put("geolocation", location)
+        return location
 
 
     def register(self, location=None):
@@ -158,6 +340,7 @@ class Iridium:
         :param location: (str) Optional location param, format [+|-]DDMM.MMM,[+|-]dddmm.mmm
         :return: (str) raw processed result
         """
+        self.invalidate_cache("geolocation")  # the location update gives a new fix
         if location: return self._process("AT+SBDREG", "=" + location)
         else: return self._process("AT+SBDREG")
 
@@ -168,9 +351,7 @@ class Iridium:
         This uses the serial interface rather than GPIO
         :return: (int) CSQ from 0 (weakest) to 5 (strongest)
         """
-        raw = self._request("AT+CSQ", 10)  
-        if raw.find("CSQ:") == -1: return 0
-        return int(raw[raw.find("CSQ:") + 4: raw.find("CSQ:") + 5])
+        return _parse_signal(self._request("AT+CSQ", 10), "CSQ:")
 
 
     def check_signal_passive(self):
@@ -179,9 +360,11 @@ class Iridium:
         This is the serial interface equivalent of checking net_avail using GPIO
         :return: (int) last known CSQ from 0 (weakest) to 5 (strongest)
         """
-        raw = self._request("AT+CSQF")  
-        if raw.find("CSQF:") == -1: return 0
-        return int(raw[raw.find("CSQF:") + 5: raw.find("CSQF:") + 6])
+        cached = self._cache_get("check_signal_passive")
+        if cached is not None: return cached[0]
+        signal = _parse_signal(self._request("AT+CSQF"), "CSQF:")
+        self._cache_put("check_signal_passive", signal)
+        return signal
 
 
     def _process(self, cmd, arg="", timeout=0.5):
@@ -191,8 +374,7 @@ class Iridium:
         :param arg: (str) argument
         :param timeout: (float) seconds before it gives up
         """
-        data = self._request(cmd + arg, timeout)
-        return data.split(cmd[3:] + ":")[1].split("\r\nOK")[0].strip()
+        return _strip(cmd, self._request(cmd + arg, timeout))
 
 
     def _request(self, command: str, timeout=0.5):
@@ -204,33 +386,70 @@ class Iridium:
         """
         self.serial.flush()
         self._write(command)
-        result, sttime = "", time.perf_counter()
-        while time.perf_counter() - sttime < timeout:
-            time.sleep(.1)
-            result += self._read()
-            if result.find("ERROR") != -1: return command[2:] + "ERROR" + "\n"  # formatted so that process() can still decode properly
-            if result.find("OK") != -1: return result
+        result, code = self._read_response(timeout)
+        if code == "ERROR": return command[2:] + "ERROR" + "\n"  # formatted so that process() can still decode properly
+        if code is not None: return result
         raise ValueError("Iridium Timeout")
 
 
     def _write(self, command: str):
         """
         Write a command to the serial port.
+        Discards anything left in the input buffer first, so stale result codes can't be mistaken for this response
         :param command: (str) Command to write
         :return: (bool) if the serial write worked
         """
+        if self._trailing_ok:
+            self._trailing_ok = False
+            self._read_response()
+        self.serial.reset_input_buffer()
+        self._trace_start(command, len(command) + 1)
         self.serial.write((command + "\r").encode("utf-8"))
 
 
-    def _read(self):
+    def _read_exact(self, size, deadline):
+        """
+        Reads exactly size bytes of binary data
+        :param size: (int) bytes to read
+        :param deadline: (float) perf_counter time before it gives up
+        :return: (bytearray) data read
         """
-        Reads in as many available bytes as it can if timeout permits.
-        :return: (str) string read from iridium
+        data = bytearray(self.serial.read(size))
+        while len(data) < size:
+            if time.perf_counter() > deadline: raise ValueError("Iridium Timeout")
+            data += self.serial.read(size - len(data))
+        return data
+
+
+    def _read(self, timeout=0.5):
         """
-        output = bytes()
-        for _ in range(50):
-            try: next_byte = self.serial.read(size=1)
-            except Exception: break
-            if next_byte == bytes(): break
-            output += next_byte
-        return output.decode("utf-8")
\ No newline at end of file
+        Reads a response, returning as soon as a final result code arrives
+        :param timeout: (float) seconds before it gives up
+        :return: (str) string read from iridium, possibly incomplete if timeout expired
+        """
+        return self._read_response(timeout)[0]
+
+
+    def _read_response(self, timeout=0.5):
+        """
+        Reads until a final result code line (OK, ERROR, READY or an SBDIX result) or until timeout expires
+        Drains everything already waiting in one read, otherwise blocks on read_until for the rest of a line
+        :param timeout: (float) seconds before it gives up
+        :return: (tuple) string read from iridium, final result code or None on timeout
+        """
+        output, scanned, deadline = bytearray(), 0, time.perf_counter() + timeout
+        while True:
+            waiting = self.serial.in_waiting
+            output += self.serial.read(waiting) if waiting else self.serial.read_until(b"\n")
+            if output: self._trace_data()
+            end = output.rfind(b"\n") + 1
+            if end > scanned:
+                code = _final_result(output, scanned, end)
+                if code == "SBDIX": self._trailing_ok = not output.rstrip().endswith(b"OK")
+                if code is not None:
+                    self._trace_end(output, code)
+                    return output.decode("utf-8"), code
+                scanned = end
+            if time.perf_counter() > deadline:
+                self._trace_end(output, None)
+                return output.decode("utf-8"), None
@@ -0,0 +1,103 @@
+# Background power channel sampler
+# Reads the power ADC channels on a thread at a fixed rate, decimates on the fly and keeps the result in a preallocated
+# ring buffer, so transients during SBDIX bursts are caught without anyone polling. Readers take snapshots without
+# locking: the writer bumps a sequence number before and after each row, and a reader retries if it changed
+
+from drivers import gpio
+import numpy as np
+import threading, time
+
+
+class Sampler:
+    def __init__(self, rate=100, capacity=4096, decimation=1, order=1, channels=gpio.POWER_CHANNELS, read=None,
+                 clock=time.monotonic):
+        """
+        :param rate: (float) raw samples per second
+        :param capacity: (int) decimated rows kept, oldest overwritten first
+        :param decimation: (int) raw samples per stored row
+        :param order: (int) CIC order, cascaded moving averages of length decimation. 1 is a plain boxcar average
+        :param channels: (sequence) ADC channels, passed to gpio.scan_adc
+        :param read: (callable) returns one row of values, gpio.scan_adc(channels) by default
+        :param clock: (callable) timestamp source, seconds
+        """
+        self.rate, self.decimation, self.order, self.clock = rate, decimation, order, clock
+        self.read = read if read is not None else lambda: gpio.scan_adc(channels)
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((capacity, len(channels)))
+        self.count, self.overruns = 0, 0  # rows written since start, raw samples taken late
+        self._seq = 0  # odd while a row is being written
+        self._stages = None  # per CIC stage: window of its last decimation inputs, running sum
+        self._phase = 0
+        self._delay = order * (decimation - 1) / 2 / rate  # CIC group delay, taken off the timestamps
+        self._thread, self._running = None, False
+
+    def start(self):
+        if self._running: raise Warning("Sampler already running")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None: self._thread.join()
+        self._thread = None
+
+    def snapshot(self, n=None):
+        """
+        Consistent copy of the newest rows, safe to call from any thread while sampling runs
+        :param n: (int) rows wanted, everything held by default
+        :return: (tuple) times, values arrays, oldest first
+        """
+        capacity = len(self.times)
+        while True:
+            seq = self._seq
+            if seq & 1: continue  # mid write
+            count = self.count
+            n_rows = min(count, capacity) if n is None else min(n, count, capacity)
+            rows = np.arange(count - n_rows, count) % capacity
+            times, values = self.times[rows], self.values[rows]
+            if self._seq == seq: return times, values
+
+    def latest(self):
+        """
+        :return: (tuple) time and values of the newest row, None before the first one
+        """
+        times, values = self.snapshot(1)
+        return (times[0], values[0]) if len(times) else None
+
+    def add(self, t, row):
+        """
+        Feeds one raw sample through decimation, storing a row every decimation samples. Called by the sampling
+        thread, exposed for feeding recorded data
+        :param t: (float) sample time
+        :param row: (np.ndarray) sample values
+        """
+        row = np.asarray(row, dtype=np.float64)
+        if self._stages is None:  # prime every window with the first sample instead of a ramp up from zero
+            self._stages = [[np.tile(row, (self.decimation, 1)), row * self.decimation] for _ in range(self.order)]
+        x = row
+        for stage in self._stages:
+            window, i = stage[0], self._phase
+            stage[1] += x - window[i]
+            window[i] = x
+            if i == self.decimation - 1: stage[1] = window.sum(axis=0)  # stop rounding drift in the running sum
+            x = stage[1] / self.decimation
+        self._phase = (self._phase + 1) % self.decimation
+        if self._phase: return
+        index = self.count % len(self.times)
+        self._seq += 1
+        self.times[index], self.values[index] = t - self._delay, x
+        self.count += 1
+        self._seq += 1
+
+    def _run(self):
+        period = 1 / self.rate
+        next_sample = time.perf_counter()
+        while self._running:
+            self.add(self.clock(), self.read())
+            next_sample += period
+            wait = next_sample - time.perf_counter()
+            if wait > 0: time.sleep(wait)
+            else:
+                self.overruns += 1
+                next_sample = time.perf_counter()  # fell behind, don't try to catch up in a burst
@@ -0,0 +1,191 @@
+# AT command timing instrumentation and transcript recording for the Iridium drivers
+# Set driver.recorder = TranscriptRecorder(...) to record every command: send time, first byte and completion
+# latency, byte counts, result code and the raw response. Records go into a bounded ring and optionally a binary log
+# Usage: python -m drivers.transcript summary|replay <log file>
+
+from collections import deque, namedtuple
+import struct, time, sys
+
+Record = namedtuple("Record", ["command", "sent", "first_byte", "completed", "tx_bytes", "rx_bytes", "code", "response"])
+# sent: unix time the command was written. first_byte, completed: seconds after sending. code: final result code,
+# "TIMEOUT" if none arrived. response: raw bytes received
+
+PAYLOAD = "SBDWB payload"  # command name recorded for the binary half of load_mo
+CODES = ("TIMEOUT", "OK", "ERROR", "READY", "SBDIX")
+_HEADER = struct.Struct("<dffIIBBH")  # sent, first_byte, completed, tx_bytes, rx_bytes, code, command length, response length
+
+
+class TranscriptRecorder:
+    def __init__(self, capacity=1024, path=None):
+        """
+        :param capacity: (int) records kept in memory, oldest dropped first
+        :param path: (str) optional binary log file, appended to
+        """
+        self.records = deque(maxlen=capacity)
+        self._file = open(path, "ab") if path else None
+
+    def record(self, record):
+        """
+        :param record: (Record) command timing to keep
+        """
+        self.records.append(record)
+        if self._file is not None:
+            command = record.command.encode("ascii")
+            self._file.write(_HEADER.pack(record.sent, record.first_byte, record.completed, record.tx_bytes,
+                                          record.rx_bytes, CODES.index(record.code), len(command), len(record.response)))
+            self._file.write(command + record.response)
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None: self._file.close()
+        self._file = None
+
+    def summary(self):
+        """
+        :return: (dict) command name (arguments stripped) to count, first byte p50 and completion p50/p95/max, in seconds
+        """
+        return summarize(self.records)
+
+
+def summarize(records):
+    """
+    :param records: (iterable) Records
+    :return: (dict) command name (arguments stripped) to count, first byte p50 and completion p50/p95/max, in seconds
+    """
+    grouped = {}
+    for record in records: grouped.setdefault(record.command.split("=")[0], []).append(record)
+    summary = {}
+    for command, group in grouped.items():
+        completed, first = sorted(r.completed for r in group), sorted(r.first_byte for r in group)
+        summary[command] = {"count": len(group), "first_byte_p50": _percentile(first, 50),
+                            "p50": _percentile(completed, 50), "p95": _percentile(completed, 95), "max": completed[-1]}
+    return summary
+
+
+def _percentile(ordered, pct):
+    """
+    Nearest rank percentile
+    :param ordered: (list) sorted samples
+    :param pct: (float) percentile, 0 to 100
+    """
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def load(path):
+    """
+    Reads a binary transcript log
+    :param path: (str) log file
+    :return: (list) Records
+    """
+    records = []
+    with open(path, "rb") as f:
+        data = f.read()
+    i = 0
+    while i + _HEADER.size <= len(data):
+        sent, first, completed, tx, rx, code, command_len, response_len = _HEADER.unpack_from(data, i)
+        i += _HEADER.size
+        if i + command_len + response_len > len(data): break  # torn final record
+        command = data[i:i + command_len].decode("ascii")
+        response = data[i + command_len:i + command_len + response_len]
+        i += command_len + response_len
+        records.append(Record(command, sent, first, completed, tx, rx, CODES[code], response))
+    return records
+
+
+class TraceHooks:
+    """
+    Mixin for the drivers, costs one attribute check per command while no recorder is attached
+    """
+    recorder = None
+    _trace = None
+
+    def _trace_start(self, command, tx_bytes):
+        if self.recorder is not None: self._trace = [command, time.time(), time.perf_counter(), None, tx_bytes]
+
+    def _trace_data(self):
+        if self._trace is not None and self._trace[3] is None: self._trace[3] = time.perf_counter()
+
+    def _trace_end(self, response, code):
+        if self._trace is None: return
+        command, sent, start, first, tx_bytes = self._trace
+        self._trace, done = None, time.perf_counter() - start
+        self.recorder.record(Record(command, sent, first - start if first is not None else done, done, tx_bytes,
+                                    len(response), code or "TIMEOUT", bytes(response)))
+
+
+class ReplaySerial:
+    """
+    Stands in for the port during replay: each write is answered instantly with the next recorded response
+    """
+    def __init__(self):
+        self.pending, self._input, self.is_open = b"", bytearray(), True
+
+    @property
+    def in_waiting(self):
+        return len(self._input)
+
+    def write(self, data):
+        self._input += self.pending
+        self.pending = b""
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self._input[:size])
+        del self._input[:size]
+        return data
+
+    def read_until(self, expected=b"\n", size=None):
+        end = self._input.find(expected)
+        return self.read(end + len(expected) if end != -1 else len(self._input))
+
+    def reset_input_buffer(self):
+        self._input.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def replay(records, driver_cls=None):
+    """
+    Feeds a recorded transcript back through the driver's reader and parsers, for regression benchmarking
+    :param records: (iterable) Records, eg from load()
+    :param driver_cls: driver class to replay through, Iridium by default
+    :return: (list) (command, parsed result or the exception raised, seconds spent reading and parsing)
+    """
+    from drivers.iridium import Iridium
+    driver = (driver_cls or Iridium).__new__(driver_cls or Iridium)
+    driver._init_cache(None)
+    driver.serial = ReplaySerial()
+    parsers = {"AT+SBDS": driver.sbd_status, "AT+SBDIX": driver.sbd_initiate_x, "AT+SBDIXA": driver.sbd_initiate_xa,
+               "AT-MSSTM": driver.network_time, "AT-MSGEO": driver.geolocation, "AT+CSQF": driver.check_signal_passive,
+               "AT+CSQ": driver.check_signal_active, "AT+SBDRB": lambda: driver.read_mt(timeout=0.1)}
+    results = []
+    for record in records:
+        driver.serial.pending, driver._trailing_ok = record.response, False
+        if record.command == PAYLOAD:
+            driver.serial.write(b"")
+            parse = lambda: driver._read_response(0)
+        else: parse = parsers.get(record.command, lambda: driver._request(record.command, 0))
+        start = time.perf_counter()
+        try: result = parse()
+        except Exception as e: result = e
+        results.append((record.command, result, time.perf_counter() - start))
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("summary", "replay"):
+        sys.exit("usage: python -m drivers.transcript summary|replay <log file>")
+    records = load(sys.argv[2])
+    if sys.argv[1] == "summary":
+        for command, stats in summarize(records).items():
+            print(f"{command:<16} n={stats['count']:<5} first byte p50 {stats['first_byte_p50'] * 1e3:8.1f} ms  "
+                  f"p50 {stats['p50'] * 1e3:8.1f} ms  p95 {stats['p95'] * 1e3:8.1f} ms  max {stats['max'] * 1e3:8.1f} ms")
+    else:
+        results = replay(records)
+        failures = [(command, result) for command, result, _ in results if isinstance(result, Exception)]
+        print(f"replayed {len(results)} commands in {sum(r[2] for r in results) * 1e3:.1f} ms, {len(failures)} failed")
+        for command, error in failures: print(f"  {command}: {error!r}")
@@ -0,0 +1,174 @@
+# Ground side decoding of MO messages
+# An MO message is a frame of one or more records (codec.split_frame), each one packet as built by comms._encode_into:
+# byte 0 compact flag, index and numerical flag, bytes 1-2 day/hour/minute, byte 3 descriptor, then an encoding byte
+# if the compact flag is set, then the data
+# Products split by comms.append_to_queue are rebuilt by Reassembler, whatever order and however often chunks arrive
+
+from collections import namedtuple, OrderedDict
+import argparse, json
+import codec
+
+Packet = namedtuple("Packet", ["descriptor", "index", "day", "hour", "minute", "encoding", "data", "last_chunk"])
+# descriptor: name from the decoder table, or the raw id if it is not in the table. encoding: codec encoding, None for
+# text. data: list of floats, or str for text packets. last_chunk: whether this is the product's final chunk
+
+Product = namedtuple("Product", ["descriptor", "day", "hour", "minute", "data", "chunks", "missing"])
+# data: chunks joined in index order. missing: indices never received, empty unless the product was flushed incomplete
+
+INDEX_LIMIT = 64  # the chunk index is 6 bits, products with more chunks than this wrap and can't be rebuilt
+
+
+def load_table(path):
+    """
+    Loads a decoder table generated from the flight registry with python -m registry
+    :param path: (str) table file
+    :return: (dict) descriptor id to its table entry: name, fields, units
+    """
+    with open(path) as f:
+        return {int(i): entry for i, entry in json.load(f)["descriptors"].items()}
+
+
+def unpack_frame(message, table=None, dictionary=b""):
+    """
+    :param message: (bytes-like) MO message as delivered by the gateway
+    :param table: (dict) decoder table from load_table
+    :param dictionary: (bytes) text compression dictionary, the flight TEXT_DICTIONARY
+    :return: (list) Packets in the order they were packed
+    """
+    return [_decode_packet(record, table, last_chunk, dictionary) for record, last_chunk in codec.split_frame(message)]
+
+
+def _decode_packet(record, table=None, last_chunk=True, dictionary=b""):
+    """
+    Inverse of comms._encode_into
+    :param record: (bytes-like) one record
+    :param table: (dict) decoder table from load_table
+    :param last_chunk: (bool) last chunk flag from the record's sub-header
+    :param dictionary: (bytes) text compression dictionary
+    :return: (Packet) decoded packet
+    """
+    if len(record) < 4: raise ValueError("Record shorter than its header")
+    flags, date = record[0], (record[1] << 8) | record[2]
+    descriptor = table[record[3]]["name"] if table and record[3] in table else record[3]
+    index, numerical, compact = (flags >> 1) & 0x3f, flags & 1, flags >> 7
+    if not numerical:
+        text = codec.decompress_text(record[4:], dictionary) if compact else bytes(record[4:])
+        return Packet(descriptor, index, date >> 11, (date >> 6) & 0x1f, date & 0x3f, None, text.decode("ascii"), last_chunk)
+    encoding, data = (record[4], record[5:]) if compact else (codec.FLOAT3, record[4:])
+    return Packet(descriptor, index, date >> 11, (date >> 6) & 0x1f, date & 0x3f, encoding,
+                  codec.decode_values(encoding, data).tolist(), last_chunk)
+
+
+class Reassembler:
+    """
+    Groups chunks by descriptor and timestamp (day, hour, minute) and emits each product as soon as its last chunk
+    and every index before it have arrived. Two products with the same descriptor queued in the same minute collide
+    A product holding all INDEX_LIMIT indices without being complete has wrapped its index. It is reported as overflowed
+    by missing() and stats, and its further chunks are counted as overflow rather than duplicates
+    """
+    def __init__(self, remember=4096):
+        """
+        :param remember: (int) completed products remembered, so late duplicates don't open a new product
+        """
+        self.remember = remember
+        self.stats = {"chunks": 0, "duplicates": 0, "products": 0, "overflowed": 0, "overflow_chunks": 0}
+        self._open, self._done = {}, OrderedDict()  # key to {index: chunk} and the last index if known, completed keys
+        self._overflowed = set()  # open keys whose index wrapped
+
+    def add(self, packet):
+        """
+        :param packet: (Packet) decoded chunk
+        :return: (Product) the product this chunk completed, None if it is still incomplete
+        """
+        key = (packet.descriptor, packet.day, packet.hour, packet.minute)
+        self.stats["chunks"] += 1
+        if key in self._done:
+            self.stats["duplicates"] += 1
+            return None
+        chunks, last = self._open.setdefault(key, ({}, [None]))
+        if key in self._overflowed:
+            self.stats["overflow_chunks"] += 1
+            return None
+        if packet.index in chunks:
+            self.stats["duplicates"] += 1
+            return None
+        chunks[packet.index] = packet
+        if packet.last_chunk: last[0] = packet.index
+        if last[0] is None or len(chunks) != last[0] + 1:
+            if len(chunks) >= INDEX_LIMIT:  # every index taken and still not finished
+                self._overflowed.add(key)
+                self.stats["overflowed"] += 1
+            return None
+        del self._open[key]
+        self._done[key] = None
+        if len(self._done) > self.remember: self._done.popitem(last=False)
+        self.stats["products"] += 1
+        return _product(key, chunks, [])
+
+    def feed(self, messages, table=None, dictionary=b""):
+        """
+        Streams MO messages through the reassembler
+        :param messages: (iterable) MO messages, bytes-like
+        :param table: (dict) decoder table from load_table
+        :param dictionary: (bytes) text compression dictionary
+        :return: (generator) Products as they complete
+        """
+        for message in messages:
+            for packet in unpack_frame(message, table, dictionary):
+                product = self.add(packet)
+                if product is not None: yield product
+
+    def missing(self):
+        """
+        Gaps in the products still open, for re-requesting
+        :return: (dict) (descriptor, day, hour, minute) to (sorted missing indices, last index or None if the last
+        chunk hasn't arrived, in which case anything after the highest index received may be missing too, and whether
+        the product overflowed INDEX_LIMIT, in which case it can't be completed and needs sending again in parts)
+        """
+        gaps = {}
+        for key, (chunks, last) in self._open.items():
+            end = last[0] if last[0] is not None else max(chunks)
+            gaps[key] = (sorted(set(range(end + 1)) - chunks.keys()), last[0], key in self._overflowed)
+        return gaps
+
+    def flush(self):
+        """
+        Gives up on every open product
+        :return: (list) incomplete Products, data from the chunks that did arrive
+        """
+        gaps = self.missing()
+        products = [_product(key, chunks, gaps[key][0]) for key, (chunks, _) in self._open.items()]
+        self._open.clear()
+        self._overflowed.clear()
+        return products
+
+
+def _product(key, chunks, missing):
+    """
+    :param key: (tuple) descriptor, day, hour, minute
+    :param chunks: (dict) index to Packet
+    :param missing: (list) indices that never arrived
+    :return: (Product) chunks joined in index order
+    """
+    ordered = [chunks[i] for i in sorted(chunks)]
+    data = "".join(p.data for p in ordered) if ordered[0].encoding is None else [v for p in ordered for v in p.data]
+    return Product(*key, data, len(ordered), missing)
+
+
+def _read(paths):
+    for path in paths:
+        with open(path, "rb") as f: yield f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode and reassemble MO messages")
+    parser.add_argument("table", help="decoder table from python -m registry")
+    parser.add_argument("messages", nargs="+", help="MO message files")
+    parser.add_argument("--dictionary", help="text compression dictionary, the flight text.dict")
+    args = parser.parse_args()
+    reassembler = Reassembler()
+    dictionary = codec.load_dictionary(args.dictionary) if args.dictionary else b""
+    for product in reassembler.feed(_read(args.messages), load_table(args.table), dictionary): print(product)
+    for key, (missing, last, overflowed) in reassembler.missing().items():
+        if overflowed: print(f"overflowed {key}: more than {INDEX_LIMIT} chunks, can't be reassembled")
+        else: print(f"incomplete {key}: missing {missing}" + ("" if last is not None else ", last chunk not received"))
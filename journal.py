@@ -0,0 +1,149 @@
+# Append-only queue journal
+# Keeps queued packets across watchdog resets and brownouts. Every enqueue and every acknowledgement is appended to a
+# segment file as a [length][crc32] framed JSON record, so a torn write at power loss only loses the record being
+# written. Recovery replays the segment once at boot. When acknowledged records dominate the segment it is rewritten
+# with only the live ones and atomically swapped in
+
+import json, os, struct, threading, time, zlib
+
+FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER = "always", "batch", "never"
+_FRAME = struct.Struct("<II")  # payload length, crc32 of payload
+
+
+class Journal:
+    def __init__(self, path, fsync=FSYNC_BATCH, batch_records=32, batch_interval=1.0, compact_bytes=1 << 20):
+        """
+        Opens the segment, recovering whatever it holds
+        :param path: (str) segment file, created if missing
+        :param fsync: (str) FSYNC_ALWAYS syncs every record, FSYNC_BATCH every batch_records records or batch_interval
+        seconds, FSYNC_NEVER leaves it to the OS
+        :param batch_records: (int) records per sync with FSYNC_BATCH
+        :param batch_interval: (float) seconds since the last sync after which the next record written syncs, with
+        FSYNC_BATCH. There is no timer, a record with nothing written after it stays unsynced until sync() or close()
+        :param compact_bytes: (int) segment size above which compaction is considered
+        """
+        if fsync not in (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER): raise ValueError(f"Unknown fsync policy {fsync}")
+        self.path, self.fsync, self.batch_records, self.batch_interval = path, fsync, batch_records, batch_interval
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._live, self._next_id, self._records, self._size = {}, 0, 0, 0
+        self._unsynced, self._last_sync = 0, time.monotonic()
+        self._recover()
+        self._file = open(path, "ab")
+
+    def pending(self, queue):
+        """
+        :param queue: (str) queue name
+        :return: (list) (id, item) not yet acknowledged, in the order they were appended
+        """
+        with self._lock: return [(i, item) for i, (name, item) in self._live.items() if name == queue]
+
+    def append(self, queue, item):
+        """
+        :param queue: (str) queue name
+        :param item: (dict) JSON serializable record of the queued item
+        :return: (int) id to acknowledge it with
+        """
+        with self._lock:
+            journal_id, self._next_id = self._next_id, self._next_id + 1
+            self._write({"op": "add", "id": journal_id, "q": queue, "item": item})
+            self._live[journal_id] = (queue, item)
+            return journal_id
+
+    def ack(self, journal_id):
+        """
+        Marks an item done, eg once SBDIX confirms it was sent. It will not be recovered again
+        :param journal_id: (int) id from append()
+        """
+        with self._lock:
+            if self._live.pop(journal_id, None) is None: return
+            self._write({"op": "ack", "id": journal_id})
+            if self._size > self.compact_bytes and len(self._live) * 2 < self._records: self.compact()
+
+    def sync(self):
+        """
+        Forces everything appended so far onto the card
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced, self._last_sync = 0, time.monotonic()
+
+    def compact(self):
+        """
+        Rewrites the segment with only unacknowledged items. The new segment is synced before it replaces the old one,
+        so a reset at any point leaves one complete segment
+        """
+        with self._lock:
+            self._file.close()
+            temp, size = self.path + ".tmp", 0
+            with open(temp, "wb") as f:
+                for journal_id, (queue, item) in self._live.items():
+                    size += f.write(_frame({"op": "add", "id": journal_id, "q": queue, "item": item}))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.path)
+            _sync_dir(self.path)
+            self._file = open(self.path, "ab")
+            self._records, self._size, self._unsynced = len(self._live), size, 0
+
+    def close(self):
+        with self._lock:
+            if self._file.closed: return
+            if self.fsync != FSYNC_NEVER: self.sync()
+            self._file.close()
+
+    def _write(self, record):
+        """
+        Appends one record and applies the fsync policy. Lock must be held
+        """
+        self._size += self._file.write(_frame(record))
+        self._records += 1
+        self._unsynced += 1
+        if self.fsync == FSYNC_ALWAYS: self.sync()
+        elif self.fsync == FSYNC_BATCH:
+            if self._unsynced >= self.batch_records or time.monotonic() - self._last_sync >= self.batch_interval:
+                self.sync()
+            else: self._file.flush()
+        else: self._file.flush()
+
+    def _recover(self):
+        """
+        Replays the segment, truncating it after the last intact record
+        """
+        if not os.path.exists(self.path): return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        i = 0
+        while i + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, i)
+            payload = data[i + _FRAME.size:i + _FRAME.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc: break  # torn write
+            record = json.loads(payload)
+            if record["op"] == "add": self._live[record["id"]] = (record["q"], record["item"])
+            else: self._live.pop(record["id"], None)
+            self._next_id = max(self._next_id, record["id"] + 1)
+            self._records, i = self._records + 1, i + _FRAME.size + length
+        if i < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(i)
+                os.fsync(f.fileno())
+        self._size = i
+
+
+def _frame(record):
+    """
+    :param record: (dict) journal record
+    :return: (bytes) framed record
+    """
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _sync_dir(path):
+    """
+    Makes a rename durable
+    """
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try: os.fsync(fd)
+    finally: os.close(fd)
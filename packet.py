@@ -0,0 +1,42 @@
+# Packets queued for downlink and decoded from uplink
+# Kept apart from comms so modules that only build packets, like power, don't import the radio stack
+
+from datetime import datetime
+
+
+class Packet:
+    def __init__(self, descriptor, args=None, return_data=None):
+        self.descriptor = descriptor
+        self.args = args if args is not None else []
+        if return_data is None: self.return_data, self.numerical = [], 1
+        elif type(return_data) == list: self.numerical, self.return_data = 1, return_data
+        elif type(return_data) == str: self.numerical, self.return_data = 0, list(return_data)
+        else: ValueError(f"Invalid return data type of {type(return_data)} with data: {return_data}")
+        self.timestamp, self.index, self.journal_id, self.last_chunk = None, 0, None, True
+
+    def __str__(self):
+        return f"{self.descriptor} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')}, index: {self.index}, numerical {self.numerical}: {self.return_data}"
+
+    def set_time(self):
+        self.timestamp = datetime.utcnow()
+
+
+class PacketChunk:
+    """
+    One chunk of a Packet, as queued by append_to_queue. Shares the packet's header fields and only slices its data
+    when the chunk is encoded
+    """
+    __slots__ = ("packet", "index", "start", "stop", "journal_id")
+
+    def __init__(self, packet, index, start, stop):
+        self.packet, self.index, self.start, self.stop, self.journal_id = packet, index, start, stop, None
+
+    descriptor = property(lambda self: self.packet.descriptor)
+    args = property(lambda self: self.packet.args)
+    numerical = property(lambda self: self.packet.numerical)
+    timestamp = property(lambda self: self.packet.timestamp)
+    return_data = property(lambda self: self.packet.return_data[self.start:self.stop])
+    last_chunk = property(lambda self: self.stop >= len(self.packet.return_data))
+
+    def __str__(self):
+        return f"{self.descriptor} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')}, index: {self.index}, numerical {self.numerical}: {self.return_data}"
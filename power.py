@@ -0,0 +1,192 @@
+# Power statistics
+# Streaming min/max/mean/variance of the power channels, battery charge and energy by trapezoidal integration, solar
+# harvest per interval and a coulomb counting state of charge estimate, all in constant memory. A summary packet of
+# these replaces downlinking raw samples
+
+from drivers import gpio
+from packet import Packet
+import numpy as np
+import threading, time
+
+SOLAR_I_1, SOLAR_V_1, SOLAR_I_2, SOLAR_V_2, BATTERY_V, BATTERY_I, PAYLOAD_I = range(7)  # columns, gpio.POWER_FIELDS order
+STATS = ("mean", "min", "max", "std")
+SUMMARY_FIELDS = tuple(f"{field}_{stat}" for field in gpio.POWER_FIELDS for stat in STATS) + \
+    ("duration", "samples", "charge_out", "energy_out", "solar_energy", "solar_energy_last", "soc")  # power_summary in registry.json
+HARVEST_INTERVAL = 3600  # seconds of solar harvest per bin
+MAX_GAP = 5  # seconds, longer gaps between samples are not integrated across
+REST_CURRENT = 0.02  # A, below this the battery voltage is close enough to open circuit
+REST_TIME = 600  # seconds at rest before the voltage is trusted to correct the coulomb count
+OCV_TABLE = ((6.0, 0.0), (6.6, 0.05), (7.0, 0.15), (7.2, 0.3), (7.4, 0.5), (7.6, 0.65), (7.8, 0.75), (8.0, 0.85),
+             (8.2, 0.95), (8.4, 1.0))  # open circuit volts to state of charge, 2S Li-ion
+
+
+class RunningStats:
+    def __init__(self, width):
+        """
+        Welford running statistics per column, rows are merged a block at a time (Chan et al.)
+        :param width: (int) columns
+        """
+        self.count = 0
+        self.mean, self.m2 = np.zeros(width), np.zeros(width)
+        self.min, self.max = np.full(width, np.inf), np.full(width, -np.inf)
+
+    def add(self, rows):
+        """
+        :param rows: (np.ndarray) samples, shape (n, width)
+        """
+        n = len(rows)
+        if not n: return
+        mean = rows.mean(axis=0)
+        m2 = ((rows - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        np.minimum(self.min, rows.min(axis=0), out=self.min)
+        np.maximum(self.max, rows.max(axis=0), out=self.max)
+
+    @property
+    def variance(self):
+        """
+        :return: (np.ndarray) sample variance per column, zero below two samples
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+
+class PowerMonitor:
+    def __init__(self, capacity, soc=None, discharge_sign=1, interval=HARVEST_INTERVAL, max_gap=MAX_GAP,
+                 rest_current=REST_CURRENT, rest_time=REST_TIME, ocv_table=OCV_TABLE, clock=time.monotonic):
+        """
+        Fed rows in gpio.POWER_FIELDS order, from gpio.scan_adc() or a drivers.sampler.Sampler
+        :param capacity: (float) battery capacity, Ah
+        :param soc: (float) starting state of charge, 0 to 1. Taken from the first battery voltage if omitted
+        :param discharge_sign: (int) 1 if a positive battery_i reading drains the battery, -1 if it charges it
+        :param interval: (float) seconds per solar harvest bin
+        :param max_gap: (float) seconds, samples further apart than this are not integrated across
+        :param rest_current: (float) A, battery current below which it counts as resting
+        :param rest_time: (float) seconds of rest before the voltage corrects the state of charge
+        :param ocv_table: (tuple) (volts, state of charge) pairs, ascending
+        :param clock: (callable) timestamp source for update(), seconds, same clock as any Sampler feeding it
+        """
+        self.capacity, self.discharge_sign, self.interval, self.max_gap = capacity, discharge_sign, interval, max_gap
+        self.rest_current, self.rest_time, self.clock = rest_current, rest_time, clock
+        self._ocv_v, self._ocv_soc = np.array([v for v, _ in ocv_table]), np.array([s for _, s in ocv_table])
+        self.stats = RunningStats(len(gpio.POWER_FIELDS))  # since the last summary
+        self.charge_out, self.energy_out, self.solar_energy = 0.0, 0.0, 0.0  # C, J, J, since start
+        self.harvest, self.harvest_last = 0.0, None  # J of solar energy, this bin and the last complete one
+        self._soc, self._anchor = soc, (soc, 0.0) if soc is not None else None  # anchor: soc, charge_out at that soc
+        self._last, self._bin_end, self._rest_since, self._window_start = None, None, None, None
+        self._lock = threading.Lock()
+
+    def update(self, row=None, t=None):
+        """
+        Adds one sample
+        :param row: (sequence) values in gpio.POWER_FIELDS order, read with gpio.scan_adc() if omitted
+        :param t: (float) sample time, clock() if omitted
+        """
+        if row is None: row = gpio.scan_adc()
+        self.add([self.clock() if t is None else t], [row])
+
+    def feed(self, sampler):
+        """
+        Adds every row a Sampler has taken since the last feed, as long as it is called before the ring wraps
+        :param sampler: (drivers.sampler.Sampler) sampler on the same clock
+        """
+        times, values = sampler.snapshot()
+        if self._last is not None:
+            new = times > self._last[0]
+            times, values = times[new], values[new]
+        self.add(times, values)
+
+    def add(self, times, rows):
+        """
+        Adds a block of samples, newer than any added before
+        :param times: (sequence) sample times, ascending
+        :param rows: (sequence) values in gpio.POWER_FIELDS order, one row per time
+        """
+        times, rows = np.asarray(times, dtype=np.float64), np.asarray(rows, dtype=np.float64).reshape(len(times), -1)
+        if not len(times): return
+        with self._lock:
+            if self._window_start is None: self._window_start = times[0]
+            self.stats.add(rows)
+            if self._anchor is None: self._anchor = (self.ocv_soc(rows[0, BATTERY_V]), 0.0)
+            if self._bin_end is None: self._bin_end = times[0] + self.interval
+            if self._last is not None: times, rows = np.concatenate(([self._last[0]], times)), np.vstack((self._last[1], rows))
+            self._last = (times[-1], rows[-1])
+            self._integrate(times, rows)
+            self._rest(times, rows)
+            soc = self._anchor[0] - (self.charge_out - self._anchor[1]) / 3600 / self.capacity
+            self._soc = min(max(soc, 0.0), 1.0)
+
+    def soc(self):
+        """
+        Cheap, no ADC access
+        :return: (float) state of charge estimate, 0 to 1, None before the first sample if no starting value was given
+        """
+        return self._soc
+
+    def ocv_soc(self, volts):
+        """
+        :param volts: (float) resting battery voltage
+        :return: (float) state of charge from the open circuit voltage table
+        """
+        return float(np.interp(volts, self._ocv_v, self._ocv_soc))
+
+    def summary(self, reset=True):
+        """
+        :param reset: (bool) start a new statistics window
+        :return: (list) values in SUMMARY_FIELDS order. Statistics cover the window, totals the whole mission, in C, J and s
+        """
+        with self._lock:
+            stats = self.stats
+            values = np.stack((stats.mean, stats.min, stats.max, np.sqrt(stats.variance)), axis=1).ravel().tolist()
+            duration = self._last[0] - self._window_start if self._window_start is not None else 0.0
+            values += [duration, stats.count, self.charge_out, self.energy_out, self.solar_energy,
+                       self.harvest_last if self.harvest_last is not None else self.harvest,
+                       self._soc if self._soc is not None else 0.0]
+            if not stats.count: values = [0.0 if v in (np.inf, -np.inf) else v for v in values]
+            if reset: self.stats, self._window_start = RunningStats(len(gpio.POWER_FIELDS)), self._last[0] if self._last else None
+            return [float(v) for v in values]
+
+    def summary_packet(self, reset=True):
+        """
+        :param reset: (bool) start a new statistics window
+        :return: (Packet) power_summary packet, timestamped, for comms.append_to_queue
+        """
+        packet = Packet("power_summary", return_data=self.summary(reset))
+        packet.set_time()
+        return packet
+
+    def _integrate(self, times, rows):
+        """
+        Trapezoidal charge, energy and solar harvest over consecutive samples. Lock must be held
+        """
+        if len(times) < 2: return
+        dt = np.diff(times)
+        dt[dt > self.max_gap] = 0
+        current = self.discharge_sign * rows[:, BATTERY_I]
+        power = current * rows[:, BATTERY_V]
+        solar = rows[:, SOLAR_I_1] * rows[:, SOLAR_V_1] + rows[:, SOLAR_I_2] * rows[:, SOLAR_V_2]
+        self.charge_out += float(((current[1:] + current[:-1]) / 2 * dt).sum())
+        self.energy_out += float(((power[1:] + power[:-1]) / 2 * dt).sum())
+        harvest, ends = (solar[1:] + solar[:-1]) / 2 * dt, times[1:]
+        self.solar_energy += float(harvest.sum())
+        while ends[-1] >= self._bin_end:  # close every bin this block runs past
+            n = int(np.searchsorted(ends, self._bin_end, side="right"))
+            self.harvest_last, self.harvest = self.harvest + float(harvest[:n].sum()), 0.0
+            harvest, ends = harvest[n:], ends[n:]
+            self._bin_end += self.interval
+            if not len(ends): return
+        self.harvest += float(harvest.sum())
+
+    def _rest(self, times, rows):
+        """
+        Re-anchors the coulomb count to the open circuit voltage once the battery has rested long enough
+        Lock must be held
+        """
+        busy = np.flatnonzero(np.abs(rows[:, BATTERY_I]) >= self.rest_current)
+        if len(busy): self._rest_since = times[busy[-1] + 1] if busy[-1] + 1 < len(times) else None
+        elif self._rest_since is None: self._rest_since = times[0]
+        if self._rest_since is not None and times[-1] - self._rest_since >= self.rest_time:
+            self._anchor, self._rest_since = (self.ocv_soc(rows[-1, BATTERY_V]), self.charge_out), times[-1]
@@ -0,0 +1,64 @@
+# Descriptor registry
+# registry.json declares every packet descriptor and uplink command: id, name, field names, units, codec encoding and
+# queue priority. It is loaded once at startup into lookup tables both ways, and generates the ground decoder table
+# Usage: python -m registry <ground table file>
+
+from collections import namedtuple
+import json, os, sys
+import codec
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "registry.json")
+ENCODING_NAMES = {"float3": codec.FLOAT3, "delta_varint": codec.DELTA_VARINT, "int16": codec.INT16}
+MAX_ID = 0x7f  # the high bit of an uplink command id flags a compact encoding
+
+Descriptor = namedtuple("Descriptor", ["id", "name", "fields", "units", "encoding", "priority"])
+# encoding: codec encoding, None to pick the smallest per packet. priority: None for the queue default
+
+
+class Registry:
+    def __init__(self, descriptors, version=1):
+        """
+        :param descriptors: (iterable) Descriptors
+        :param version: (int) schema version
+        """
+        self.version = version
+        self.by_name, self.by_id = {}, {}
+        for d in descriptors:
+            if not 0 <= d.id <= MAX_ID: raise ValueError(f"Descriptor id {d.id} out of range for {d.name}")
+            if d.id in self.by_id or d.name in self.by_name: raise ValueError(f"Duplicate descriptor {d.id} {d.name}")
+            if len(d.units) != len(d.fields): raise ValueError(f"Units and fields differ in length for {d.name}")
+            self.by_name[d.name], self.by_id[d.id] = d, d
+        self.ids = {d.name: d.id for d in self.by_name.values()}  # name to id
+        self.names = {d.id: d.name for d in self.by_name.values()}  # id to name
+        self.encodings = {d.name: d.encoding for d in self.by_name.values() if d.encoding is not None}
+        self.priorities = {d.name: d.priority for d in self.by_name.values() if d.priority is not None}
+
+    def ground_table(self):
+        """
+        :return: (dict) JSON serializable decoder table for ground.load_table
+        """
+        return {"version": self.version,
+                "descriptors": {str(d.id): {"name": d.name, "fields": d.fields, "units": d.units} for d in self.by_id.values()}}
+
+
+def load(path=SCHEMA_PATH):
+    """
+    :param path: (str) schema file
+    :return: (Registry) lookup tables
+    """
+    with open(path) as f:
+        schema = json.load(f)
+    descriptors = []
+    for entry in schema["descriptors"]:
+        encoding = entry.get("encoding")
+        if encoding is not None and encoding not in ENCODING_NAMES: raise ValueError(f"Unknown encoding {encoding}")
+        descriptors.append(Descriptor(entry["id"], entry["name"], list(entry.get("fields", [])),
+                                      list(entry.get("units", [""] * len(entry.get("fields", [])))),
+                                      ENCODING_NAMES.get(encoding), entry.get("priority")))
+    return Registry(descriptors, schema.get("version", 1))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2: sys.exit("usage: python -m registry <ground table file>")
+    with open(sys.argv[1], "w") as f:
+        json.dump(load().ground_table(), f, indent=2)
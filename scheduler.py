@@ -0,0 +1,86 @@
+# SBDIX retry scheduling
+# Decides when the next SBD session is worth the power: NET_AVAIL, CSQF and the class of the last SBDIX failure
+# set the pace, with exponential backoff, jitter and a per-orbit session budget
+
+from drivers.iridium import MO_SUCCESS_CODES, NO_SIGNAL_CODES
+import random, time
+from collections import deque
+
+ORBIT_PERIOD = 5560  # seconds, ~93 minutes in LEO
+CSQF_INTERVAL = 40  # the modem only refreshes CSQF this often, no point looking again sooner
+
+
+class RetryScheduler:
+    def __init__(self, base_delay=20, max_delay=900, jitter=0.3, csq_threshold=2, session_budget=30,
+                 orbit_period=ORBIT_PERIOD, hardware_delay=1800, csq_interval=CSQF_INTERVAL, clock=time.monotonic,
+                 rng=None):
+        """
+        :param base_delay: (float) seconds to wait after the first no-signal failure, doubled for each one after
+        :param max_delay: (float) ceiling on the no-signal backoff
+        :param jitter: (float) fraction of the delay randomized either way, so retries don't phase lock with passes
+        :param csq_threshold: (int) minimum CSQF, 0 to 5, before a session is attempted
+        :param session_budget: (int) sessions allowed per orbit_period, counted over a sliding window
+        :param orbit_period: (float) seconds the budget window covers
+        :param hardware_delay: (float) seconds to wait after a hardware fault before trying again
+        :param csq_interval: (float) seconds to wait before rechecking signal that was below threshold
+        :param clock: (callable) time source, seconds
+        :param rng: (random.Random) jitter source
+        """
+        self.base_delay, self.max_delay, self.jitter = base_delay, max_delay, jitter
+        self.csq_threshold, self.session_budget, self.orbit_period = csq_threshold, session_budget, orbit_period
+        self.hardware_delay, self.csq_interval = hardware_delay, csq_interval
+        self.clock, self.rng = clock, rng if rng is not None else random.Random()
+        self.failures, self.next_attempt, self.sessions = 0, 0, deque()
+
+    def _window(self):
+        """
+        Drops sessions that have left the budget window
+        :return: (float) current time
+        """
+        now = self.clock()
+        while self.sessions and now - self.sessions[0] >= self.orbit_period: self.sessions.popleft()
+        return now
+
+    def due(self):
+        """
+        Cheap check, no modem or GPIO access
+        :return: (bool) True if backoff has expired and the orbit budget has room
+        """
+        now = self._window()
+        return now >= self.next_attempt and len(self.sessions) < self.session_budget
+
+    def signal_ok(self, csq):
+        """
+        Gates a session on signal. Below threshold the next attempt waits for the next CSQF refresh
+        :param csq: (int) CSQF, 0 if NET_AVAIL is low
+        :return: (bool) True if signal is good enough to spend a session on
+        """
+        if csq >= self.csq_threshold: return True
+        self.next_attempt = max(self.next_attempt, self.clock() + self.csq_interval)
+        return False
+
+    def record(self, result):
+        """
+        Updates the backoff from an SBDIX result
+        :param result: (list) sbd_initiate_x output
+        """
+        now = self._window()
+        self.sessions.append(now)
+        if result[0] in MO_SUCCESS_CODES:
+            self.failures, self.next_attempt = 0, now
+            return
+        if result[0] in NO_SIGNAL_CODES:
+            self.failures += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        else: delay = self.hardware_delay
+        self.next_attempt = now + delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def wait_time(self):
+        """
+        :return: (float) seconds until a session may be attempted, counting both backoff and budget
+        """
+        now = self._window()
+        wait = self.next_attempt - now
+        if len(self.sessions) >= self.session_budget:
+            wait = max(wait, self.sessions[len(self.sessions) - self.session_budget] + self.orbit_period - now)
+        return max(wait, 0)
@@ -0,0 +1 @@
+# Simulated hardware for running flight software without the bus attached
@@ -0,0 +1,102 @@
+# Simulated RPi.GPIO
+# Same calls and constants as the parts of RPi.GPIO used by drivers/gpio.py, plus drive() and pulse() to play the
+# part of the hardware on the other end of an input pin. Edge callbacks run in order on one event thread, like RPi.GPIO's
+
+import threading, time, queue
+
+BCM, BOARD = 11, 10
+OUT, IN = 0, 1
+LOW, HIGH = 0, 1
+PUD_OFF, PUD_DOWN, PUD_UP = 20, 21, 22
+RISING, FALLING, BOTH = 31, 32, 33
+
+
+class SimGPIO:
+    BCM, BOARD, OUT, IN, LOW, HIGH = BCM, BOARD, OUT, IN, LOW, HIGH
+    PUD_OFF, PUD_DOWN, PUD_UP, RISING, FALLING, BOTH = PUD_OFF, PUD_DOWN, PUD_UP, RISING, FALLING, BOTH
+
+    def __init__(self):
+        self.mode, self.directions, self.levels, self.events = None, {}, {}, {}
+        self.history = []  # (time, pin, level) for every level change, driven or output
+        self._lock, self._callbacks, self._thread = threading.Lock(), queue.Queue(), None
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        self.directions[pin] = direction
+        if direction == OUT and initial is not None: self.levels[pin] = initial
+        elif direction == IN and pin not in self.levels: self.levels[pin] = HIGH if pull_up_down == PUD_UP else LOW
+
+    def output(self, pin, state):
+        if self.directions.get(pin) != OUT: raise RuntimeError(f"GPIO {pin} has not been set up as an output")
+        self._set(pin, int(bool(state)))
+
+    def input(self, pin):
+        if pin not in self.directions: raise RuntimeError(f"GPIO {pin} has not been set up")
+        return self.levels.get(pin, LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if self.directions.get(pin) != IN: raise RuntimeError(f"GPIO {pin} has not been set up as an input")
+        if pin in self.events: raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        self.events[pin] = {"edge": edge, "callbacks": [callback] if callback else [], "bounce": (bouncetime or 0) / 1000,
+                            "last": None, "detected": False}
+
+    def add_event_callback(self, pin, callback):
+        self.events[pin]["callbacks"].append(callback)
+
+    def remove_event_detect(self, pin):
+        self.events.pop(pin, None)
+
+    def event_detected(self, pin):
+        event = self.events.get(pin)
+        if event is None or not event["detected"]: return False
+        event["detected"] = False
+        return True
+
+    def cleanup(self, pin=None):
+        for p in ([pin] if pin is not None else list(self.directions)):
+            self.directions.pop(p, None)
+            self.events.pop(p, None)
+
+    def drive(self, pin, level):
+        """
+        Sets an input pin from the outside, firing edge callbacks
+        :param pin: (int) BCM pin
+        :param level: (int) LOW or HIGH
+        """
+        self._set(pin, int(bool(level)))
+
+    def pulse(self, pin, width=0.01, active=LOW):
+        """
+        Drives an input pin to active for width seconds, then back, like a ring alert on RI
+        :param pin: (int) BCM pin
+        :param width: (float) seconds
+        :param active: (int) level during the pulse
+        """
+        self.drive(pin, active)
+        time.sleep(width)
+        self.drive(pin, 1 - active)
+
+    def _set(self, pin, level):
+        with self._lock:
+            previous = self.levels.get(pin, LOW)
+            self.levels[pin] = level
+            if previous == level: return
+            now = time.monotonic()
+            self.history.append((now, pin, level))
+            event = self.events.get(pin)
+            if event is None or event["edge"] not in (BOTH, RISING if level else FALLING): return
+            if event["last"] is not None and now - event["last"] < event["bounce"]: return
+            event["last"], event["detected"] = now, True
+            callbacks = list(event["callbacks"])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, daemon=True)
+                self._thread.start()
+        for callback in callbacks: self._callbacks.put((callback, pin))
+
+    def _dispatch(self):
+        while True:
+            callback, pin = self._callbacks.get()
+            try: callback(pin)
+            except Exception as e: print(f"Exception in GPIO {pin} callback: {e!r}")
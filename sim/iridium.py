@@ -0,0 +1,276 @@
+# Iridium 9602N simulator on a Linux pseudo-terminal
+# Speaks the AT subset used by drivers/iridium.py so the driver and comms.contact() can run without a modem
+# Usage: python -m sim.iridium --profile realistic, then point Iridium(port=...) at the printed port
+
+import os, tty, select, threading, time, random, argparse
+from datetime import datetime
+
+EPOCH = datetime(2014, 5, 11, 14, 23, 55).timestamp()  # Same epoch as drivers/iridium.py
+MAX_MO_SIZE = 340
+NO_SIGNAL_CODES = (10, 11, 12, 13, 14, 17, 18, 19, 32, 35, 36, 37, 38)
+
+# Timing presets. Latencies are in seconds, dropouts are (start, duration) pairs relative to start()
+PROFILES = {
+    "ideal": dict(latency=0, sbdix_latency=0.1, csq_latency=0, failure_rate=0, dropouts=()),
+    "realistic": dict(latency=0.02, sbdix_latency=12, csq_latency=2, failure_rate=0.15, dropouts=((300, 60),)),
+    "worst": dict(latency=0.2, sbdix_latency=45, csq_latency=10, failure_rate=0.6, dropouts=((30, 90), (200, 120))),
+}
+
+
+class IridiumSimulator:
+    def __init__(self, latency=0.02, sbdix_latency=1, csq_latency=0, signal=5, dropouts=(), sbdix_results=(),
+                 failure_rate=0, failure_codes=NO_SIGNAL_CODES, mt_queue=(), baudrate=19200, echo=True,
+                 location=(-2475, 5014, 2437), seed=None):
+        """
+        :param latency: (float) seconds before the modem answers an ordinary command
+        :param sbdix_latency: (float) seconds an SBDIX session takes
+        :param csq_latency: (float) seconds an active AT+CSQ takes
+        :param signal: (int) CSQ from 0 to 5 when not in a dropout
+        :param dropouts: (iterable) (start, duration) windows, seconds after start(), with no signal
+        :param sbdix_results: (iterable) MO status codes used by successive SBDIX sessions before falling back to failure_rate
+        :param failure_rate: (float) probability that an SBDIX session fails with one of failure_codes
+        :param failure_codes: (iterable) MO status codes to pick from when a session fails
+        :param mt_queue: (iterable) MT messages (bytes) waiting at the GSS
+        :param baudrate: (int) paces output like the real UART, None or 0 to write as fast as the pty allows
+        :param echo: (bool) echo commands like ATE1
+        :param location: (tuple) x, y, z in km reported by MSGEO
+        :param seed: random seed for failure injection
+        """
+        self.latency, self.sbdix_latency, self.csq_latency = latency, sbdix_latency, csq_latency
+        self.signal, self.dropouts = signal, list(dropouts)
+        self.sbdix_results, self.failure_rate, self.failure_codes = list(sbdix_results), failure_rate, list(failure_codes)
+        self.mt_queue = [bytes(m) for m in mt_queue]
+        self.baudrate, self.echo, self.location = baudrate, echo, location
+        self.ring_alerts, self.on_ring = False, None  # on_ring is called when an MT message arrives with SBDMTA=1
+        self.random = random.Random(seed)
+        self.mo, self.mt, self.momsn, self.mtmsn = None, None, 0, 0
+        self.geo_time = time.time()
+        self.delivered = []  # MO messages that reached the gateway, in order
+        self.stats = {"commands": 0, "sessions": 0, "failed_sessions": 0, "mo_bytes": 0, "mt_bytes": 0}
+        self.port, self._master, self._slave, self._thread, self._running, self._t0 = None, None, None, None, False, 0
+        self._pins, self._pin_thread = None, None  # SimGPIO wiring, see wire()
+
+    @classmethod
+    def from_profile(cls, name, **kwargs):
+        """
+        Creates a simulator from one of PROFILES, with keyword overrides
+        :param name: (str) profile name
+        """
+        return cls(**{**PROFILES[name], **kwargs})
+
+    def start(self):
+        """
+        Opens the pty and starts answering commands
+        :return: (str) path of the port to hand to Serial/Iridium
+        """
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port, self._running, self._t0 = os.ttyname(self._slave), True, time.monotonic()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        if self._pins is not None: self._start_pins()
+        return self.port
+
+    def wire(self, gpio, net_avail, ring_indicator, period=0.01):
+        """
+        Plays the modem's side of NET_AVAIL and RI on a sim.gpio.SimGPIO: NET_AVAIL follows the simulated signal,
+        RI pulses low when an MT message arrives with ring alerts on
+        :param gpio: (SimGPIO) simulated GPIO, eg drivers.backend.gpio() on the sim backend
+        :param net_avail: (int) NET_AVAIL pin
+        :param ring_indicator: (int) RI pin
+        :param period: (float) seconds between NET_AVAIL updates
+        """
+        self._pins = (gpio, net_avail, ring_indicator, period)
+        gpio.drive(ring_indicator, gpio.HIGH)  # RI idles high
+        gpio.drive(net_avail, self.network_available())
+        if self._running and self._pin_thread is None: self._start_pins()
+
+    def stop(self):
+        """
+        Stops the simulator and closes the pty
+        """
+        self._running = False
+        if self._thread is not None: self._thread.join()
+        if self._pin_thread is not None: self._pin_thread.join()
+        self._pin_thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None: os.close(fd)
+        self._master = self._slave = self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def current_signal(self):
+        """
+        :return: (int) CSQ right now, 0 inside a dropout window
+        """
+        t = time.monotonic() - self._t0
+        if any(start <= t < start + duration for start, duration in self.dropouts): return 0
+        return self.signal
+
+    def network_available(self):
+        """
+        Stand-in for the NET_AVAIL pin
+        :return: (int) 1 if there is signal
+        """
+        return int(self.current_signal() > 0)
+
+    def deliver_mt(self, message):
+        """
+        An MT message arrives at the GSS. With ring alerts on, pulses RI if wired and calls on_ring if set
+        :param message: (bytes) message
+        """
+        self.mt_queue.append(bytes(message))
+        if not self.ring_alerts: return
+        if self._pins is not None: self._pins[0].pulse(self._pins[2])
+        if self.on_ring is not None: self.on_ring()
+
+    def _start_pins(self):
+        self._pin_thread = threading.Thread(target=self._drive_pins, daemon=True)
+        self._pin_thread.start()
+
+    def _drive_pins(self):
+        gpio, net_avail, _, period = self._pins
+        while self._running:
+            gpio.drive(net_avail, self.network_available())  # SimGPIO ignores a drive to the current level
+            time.sleep(period)
+
+    def _serve(self):
+        line, binary = bytearray(), None
+        while self._running:
+            if not select.select([self._master], [], [], 0.05)[0]: continue
+            try: data = os.read(self._master, 1024)
+            except OSError: break
+            while data:
+                if binary is not None:  # SBDWB payload plus two checksum bytes
+                    take = binary[0] + 2 - len(binary[1])
+                    binary[1].extend(data[:take])
+                    data = data[take:]
+                    if len(binary[1]) == binary[0] + 2:
+                        self._load_mo(bytes(binary[1]))
+                        binary = None
+                    continue
+                end = data.find(b"\r")
+                if end == -1:
+                    line += data
+                    break
+                line += data[:end]
+                data = data[end + 1:]
+                if self.echo: self._send(bytes(line) + b"\r")
+                binary = self._handle(line.decode("ascii", "replace").strip())
+                line = bytearray()
+
+    def _send(self, data):
+        if not self.baudrate:
+            os.write(self._master, data)
+            return
+        for i in range(0, len(data), 16):
+            os.write(self._master, data[i:i + 16])
+            time.sleep(len(data[i:i + 16]) * 10 / self.baudrate)
+
+    def _respond(self, body="", delay=None):
+        time.sleep(self.latency if delay is None else delay)
+        self._send((f"\r\n{body}\r\n" if body else "").encode("ascii") + b"\r\nOK\r\n")
+
+    def _handle(self, cmd):
+        """
+        Answers one command line
+        :return: (list) [length, buffer] if the modem is now waiting for an SBDWB payload, otherwise None
+        """
+        self.stats["commands"] += 1
+        upper = cmd.upper()
+        if upper.startswith("AT+SBDWB="):
+            length = int(upper.split("=")[1])
+            time.sleep(self.latency)
+            if length > MAX_MO_SIZE or length < 1:
+                self._send(b"\r\n3\r\n\r\nOK\r\n")
+                return None
+            self._send(b"\r\nREADY\r\n")
+            return [length, bytearray()]
+        if upper == "AT+SBDRB": self._read_mt()
+        elif upper in ("AT+SBDIX", "AT+SBDIXA"): self._respond(f"+{upper[3:]}: {self._session()}", self.sbdix_latency)
+        elif upper == "AT+SBDS":
+            self._respond(f"+SBDS: {int(self.mo is not None)}, {self.momsn}, {int(self.mt is not None)}, "
+                          f"{self.mtmsn if self.mt is not None else -1}")
+        elif upper.startswith("AT+SBDD"):
+            which = upper[7:] or "0"
+            if which in ("0", "2"): self.mo = None
+            if which in ("1", "2"): self.mt = None
+            self._respond("0")
+        elif upper == "AT-MSSTM":
+            if self.current_signal(): self._respond(f"-MSSTM: {int((time.time() - EPOCH) / 0.09):x}")
+            else: self._respond("-MSSTM: no network service")
+        elif upper == "AT-MSGEO":
+            x, y, z = self.location
+            self._respond(f"-MSGEO: {x},{y},{z},{int((self.geo_time - EPOCH) / 0.09):x}")
+        elif upper == "AT+CSQ": self._respond(f"+CSQ:{self.current_signal()}", self.csq_latency)
+        elif upper == "AT+CSQF": self._respond(f"+CSQF:{self.current_signal()}")
+        elif upper.startswith("AT+SBDREG"):
+            self._respond("+SBDREG:2,0" if self.current_signal() else "+SBDREG:0,17", self.sbdix_latency)
+        elif upper.startswith("AT+SBDMTA="):
+            self.ring_alerts = upper.endswith("1")
+            self._respond()
+        elif upper in ("AT", "AT*F", "ATZN", "ATZ0", "ATZ1", "ATE0", "ATE1", "AT&K0"):
+            if upper == "ATE0": self.echo = False
+            if upper == "ATE1": self.echo = True
+            self._respond()
+        else:
+            time.sleep(self.latency)
+            self._send(b"\r\nERROR\r\n")
+        return None
+
+    def _load_mo(self, data):
+        payload, checksum = data[:-2], (data[-2] << 8) | data[-1]
+        time.sleep(self.latency)
+        if checksum != sum(payload) & 0xffff:
+            self._send(b"\r\n2\r\n\r\nOK\r\n")
+            return
+        self.mo = payload
+        self._send(b"\r\n0\r\n\r\nOK\r\n")
+
+    def _read_mt(self):
+        time.sleep(self.latency)
+        payload = self.mt if self.mt is not None else b""
+        checksum = sum(payload) & 0xffff
+        self._send(bytes([len(payload) >> 8, len(payload) & 0xff]) + payload + bytes([checksum >> 8, checksum & 0xff]))
+        self._send(b"\r\nOK\r\n")
+
+    def _session(self):
+        """
+        Runs one SBDIX session against the simulated gateway
+        :return: (str) SBDIX result fields
+        """
+        self.stats["sessions"] += 1
+        if self.sbdix_results: status = self.sbdix_results.pop(0)
+        elif self.random.random() < self.failure_rate: status = self.random.choice(self.failure_codes)
+        else: status = 0
+        if not self.current_signal(): status = 32
+        if status > 4:
+            self.stats["failed_sessions"] += 1
+            return f"{status}, {self.momsn}, 2, {self.mtmsn}, 0, 0"
+        if self.mo is not None:
+            self.stats["mo_bytes"] += len(self.mo)
+            self.delivered.append(self.mo)
+        self.momsn, self.geo_time = self.momsn + 1, time.time()
+        mt_status, mt_length = 0, 0
+        if self.mt_queue:
+            self.mt, self.mtmsn = self.mt_queue.pop(0), self.mtmsn + 1
+            mt_status, mt_length = 1, len(self.mt)
+            self.stats["mt_bytes"] += mt_length
+        return f"{status}, {self.momsn - 1}, {mt_status}, {self.mtmsn}, {mt_length}, {len(self.mt_queue)}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Iridium 9602N simulator on a pty")
+    parser.add_argument("--profile", choices=PROFILES, default="realistic")
+    parser.add_argument("--mt", type=int, default=0, help="number of MT messages queued at the GSS")
+    args = parser.parse_args()
+    sim = IridiumSimulator.from_profile(args.profile, mt_queue=[bytes([0])] * args.mt)
+    print(sim.start(), flush=True)
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt: sim.stop()
@@ -0,0 +1,158 @@
+# Simulated smbus2 SMBus with a BNO055 on the bus
+# Keeps both register pages, handles page select, mode changes and the reset trigger, and refreshes the sensor data
+# registers from a slowly tumbling body every output period, so drivers/imu.py can run off the Pi
+
+import math, random, threading, time
+
+BNO055_ADDRESS = 0x28
+CHIP_ID, ACC_ID, MAG_ID, GYR_ID = 0xA0, 0xFB, 0x32, 0x0F
+PAGE_REGISTER, MODE_REGISTER, TRIGGER_REGISTER, CALIBRATION_REGISTER, TEMP_REGISTER = 0x07, 0x3D, 0x3F, 0x35, 0x34
+CONFIG_MODE = 0x00
+DATA_REGISTERS = range(0x08, 0x35)  # accel through temperature on page 0
+# Register defaults after reset, datasheet table 4-2 and 4-3
+PAGE0_DEFAULTS = {0x00: CHIP_ID, 0x01: ACC_ID, 0x02: MAG_ID, 0x03: GYR_ID, 0x04: 0x11, 0x05: 0x03, 0x06: 0x15,
+                  0x35: 0xFF, 0x36: 0x0F, 0x39: 0x01, 0x3B: 0x80, 0x41: 0x24, 0x42: 0x00}
+PAGE1_DEFAULTS = {0x08: 0x0D, 0x09: 0x6D, 0x0A: 0x38, 0x0B: 0x00}
+# Fixed point scales of the data registers, LSB per unit, matching IMU's *_SCALE constants
+ACCEL_LSB, MAG_LSB, GYRO_LSB, EULER_LSB, QUATERNION_LSB = 100, 16, 900, 16, 1 << 14
+
+
+class SimSMBus:
+    def __init__(self, bus=1, address=BNO055_ADDRESS, rate=(0.02, 0.01, 0.05), field=(20.0, 0.0, -40.0),
+                 gravity=(0.0, 0.0, 9.81), temperature=25, noise=0.01, latency=0.0, output_period=0.01,
+                 clock=time.monotonic, seed=None):
+        """
+        :param bus: (int) I2C bus number, for show
+        :param address: (int) 7 bit address the BNO055 answers on, anything else raises OSError like a missing device
+        :param rate: (tuple) body rates about x, y, z, rad/s
+        :param field: (tuple) magnetic field in the starting body frame, uT
+        :param gravity: (tuple) acceleration the accelerometer feels in the starting body frame, m/s^2
+        :param temperature: (int) chip temperature, C
+        :param noise: (float) relative gaussian noise on accelerometer, magnetometer and gyro readings
+        :param latency: (float) seconds each bus transaction takes
+        :param output_period: (float) seconds between sensor data updates, 100 Hz in fusion modes
+        :param clock: (callable) time source, seconds
+        :param seed: random seed for the noise
+        """
+        self.bus, self.address, self.rate, self.field, self.gravity = bus, address, rate, field, gravity
+        self.temperature, self.noise, self.latency, self.output_period, self.clock = temperature, noise, latency, output_period, clock
+        self.random, self.transactions = random.Random(seed), 0
+        self.pages, self._pointer, self._updated, self._t0 = None, 0, None, clock()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def write_byte_data(self, i2c_addr, register, value):
+        with self._lock:
+            self._transaction(i2c_addr)
+            self._write(register, value)
+
+    def read_byte_data(self, i2c_addr, register):
+        with self._lock:
+            self._transaction(i2c_addr)
+            return self._read(register)
+
+    def write_byte(self, i2c_addr, value):
+        """
+        Sets the register pointer for the next read_byte
+        """
+        with self._lock:
+            self._transaction(i2c_addr)
+            self._pointer = value & 0xff
+
+    def read_byte(self, i2c_addr):
+        """
+        Reads at the register pointer and advances it, like the BNO055's auto increment
+        """
+        with self._lock:
+            self._transaction(i2c_addr)
+            value = self._read(self._pointer)
+            self._pointer = (self._pointer + 1) & 0xff
+            return value
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        with self._lock:
+            self._transaction(i2c_addr)
+            return [self._read((register + i) & 0xff) for i in range(length)]
+
+    def write_i2c_block_data(self, i2c_addr, register, data):
+        with self._lock:
+            self._transaction(i2c_addr)
+            for i, value in enumerate(data): self._write((register + i) & 0xff, value)
+
+    def close(self):
+        pass
+
+    def _transaction(self, i2c_addr):
+        if i2c_addr != self.address: raise OSError(121, "Remote I/O error")
+        if self.latency: time.sleep(self.latency)
+        self.transactions += 1
+
+    def _page(self):
+        return self.pages[self.pages[0][PAGE_REGISTER] & 1]
+
+    def _read(self, register):
+        page = self.pages[0][PAGE_REGISTER] & 1
+        if page == 0 and register in DATA_REGISTERS and self.pages[0][MODE_REGISTER] & 0x0F != CONFIG_MODE:
+            now = self.clock()
+            if self._updated is None or now - self._updated >= self.output_period: self._update(now)
+        return self._page()[register]
+
+    def _write(self, register, value):
+        value &= 0xff
+        if register == PAGE_REGISTER: self.pages[0][PAGE_REGISTER] = self.pages[1][PAGE_REGISTER] = value & 1
+        elif register == TRIGGER_REGISTER and value & 0x20 and self.pages[0][PAGE_REGISTER] == 0: self._reset()
+        else: self._page()[register] = value
+
+    def _reset(self):
+        """
+        Power on defaults, config mode and no sensor data
+        """
+        self.pages = [bytearray(256), bytearray(256)]
+        for register, value in PAGE0_DEFAULTS.items(): self.pages[0][register] = value
+        for register, value in PAGE1_DEFAULTS.items(): self.pages[1][register] = value
+        self.pages[0][TEMP_REGISTER] = self.temperature & 0xff
+        self._pointer, self._updated = 0, None
+
+    def _update(self, now):
+        """
+        Writes the body's current attitude and the sensors' view of it into the data registers
+        """
+        self._updated = now
+        t = now - self._t0
+        roll, pitch, heading = (r * t for r in self.rate)
+        cr, sr, cp, sp, ch, sh = math.cos(roll), math.sin(roll), math.cos(pitch), math.sin(pitch), math.cos(heading), math.sin(heading)
+        # body from reference, z-y-x order
+        matrix = ((cp * ch, cp * sh, -sp),
+                  (sr * sp * ch - cr * sh, sr * sp * sh + cr * ch, sr * cp),
+                  (cr * sp * ch + sr * sh, cr * sp * sh - sr * ch, cr * cp))
+        rotate = lambda v: [sum(matrix[i][j] * v[j] for j in range(3)) for i in range(3)]
+        jitter = lambda v: [x + self.random.gauss(0, self.noise * (abs(x) + 1)) if self.noise else x for x in v]
+        accel, mag, gyro = jitter(rotate(self.gravity)), jitter(rotate(self.field)), jitter(self.rate)
+        quaternion = _quaternion(roll / 2, pitch / 2, heading / 2)
+        euler = [math.degrees(heading) % 360, math.degrees(roll), math.degrees(pitch)]
+        page = self.pages[0]
+        _put(page, 0x08, accel, ACCEL_LSB)
+        _put(page, 0x0E, mag, MAG_LSB)
+        _put(page, 0x14, gyro, GYRO_LSB)
+        _put(page, 0x1A, euler, EULER_LSB)
+        _put(page, 0x20, quaternion, QUATERNION_LSB)
+        _put(page, 0x28, [0.0, 0.0, 0.0], ACCEL_LSB)  # linear acceleration, the body only rotates
+        _put(page, 0x2E, rotate(self.gravity), ACCEL_LSB)
+
+
+def _quaternion(half_roll, half_pitch, half_heading):
+    """
+    :return: (list) w, x, y, z for the z-y-x rotation
+    """
+    cr, sr, cp, sp = math.cos(half_roll), math.sin(half_roll), math.cos(half_pitch), math.sin(half_pitch)
+    ch, sh = math.cos(half_heading), math.sin(half_heading)
+    return [cr * cp * ch + sr * sp * sh, sr * cp * ch - cr * sp * sh, cr * sp * ch + sr * cp * sh, cr * cp * sh - sr * sp * ch]
+
+
+def _put(page, register, values, lsb):
+    """
+    Writes values as 16 bit two's complement, LSB first
+    """
+    for i, value in enumerate(values):
+        raw = min(max(int(round(value * lsb)), -32768), 32767) & 0xffff
+        page[register + 2 * i], page[register + 2 * i + 1] = raw & 0xff, raw >> 8
@@ -0,0 +1,77 @@
+# Simulated spidev SpiDev with an MCP3208 on the bus
+# Each channel follows a waveform, volts at the ADC pin as a function of time, so the power housekeeping, scan_adc and
+# the background sampler can run and be profiled off the Pi. Transfers can be given a fixed latency like the real bus
+
+import math, random, threading, time
+
+VREF = 3  # drivers/gpio.py ADC_VREF
+ORBIT_PERIOD = 5560  # seconds
+
+
+def sunlit(t):
+    """
+    :return: (float) 0 in eclipse up to 1 at the subsolar point, for an orbit starting at dawn
+    """
+    return max(math.sin(2 * math.pi * t / ORBIT_PERIOD), 0.0)
+
+
+# Volts at the ADC for each power channel, undoing drivers/gpio.py ADC_GAINS: solar_i_1, solar_v_1, solar_i_2, solar_v_2,
+# battery_v, battery_i (with a 10 s transmit burst every 10 minutes), payload_i
+WAVEFORMS = {
+    0: lambda t: 0.45 * sunlit(t) * 0.4,
+    1: lambda t: (8.4 if sunlit(t) > 0 else 0.3) / 8.5,
+    2: lambda t: 0.4 * sunlit(t) * 0.4,
+    3: lambda t: (8.3 if sunlit(t) > 0 else 0.3) / 8.5,
+    4: lambda t: (7.6 + 0.3 * sunlit(t) - (0.25 if t % 600 < 10 else 0)) / 3,
+    5: lambda t: (0.12 + (1.3 if t % 600 < 10 else 0)) * 0.4,
+    6: lambda t: 0.05 * 0.4,
+    7: lambda t: 0.0,
+}
+
+
+class SimSpi:
+    def __init__(self, waveforms=None, noise=0.002, latency=0.0, vref=VREF, clock=time.monotonic, seed=None):
+        """
+        :param waveforms: (dict) channel to volts, either a float or a callable taking seconds since the bus was
+        created. Channels not given follow WAVEFORMS
+        :param noise: (float) standard deviation of gaussian noise added to every conversion, volts
+        :param latency: (float) seconds each transfer takes
+        :param vref: (float) reference voltage, readings clip to 0..vref
+        :param clock: (callable) time source, seconds
+        :param seed: random seed for the noise
+        """
+        self.waveforms = {**WAVEFORMS, **(waveforms or {})}
+        self.noise, self.latency, self.vref, self.clock = noise, latency, vref, clock
+        self.random, self.transfers = random.Random(seed), 0
+        self.max_speed_hz, self.mode, self.bus, self.device = 500000, 0, None, None
+        self._t0, self._lock = clock(), threading.Lock()
+
+    def open(self, bus, device):
+        self.bus, self.device = bus, device
+
+    def close(self):
+        self.bus = self.device = None
+
+    def voltage(self, channel):
+        """
+        :param channel: (int) 0 to 7
+        :return: (float) volts at the pin right now, before noise and quantization
+        """
+        wave = self.waveforms[channel]
+        return wave(self.clock() - self._t0) if callable(wave) else wave
+
+    def xfer2(self, mosi):
+        """
+        Answers an MCP3208 single ended conversion, see fig 6-1 in the datasheet
+        :param mosi: (list) 3 command bytes
+        :return: (list) 3 reply bytes, the 12 bit code in the low nibble of the second and the third
+        """
+        if self.bus is None: raise OSError(9, "Bad file descriptor")
+        if self.latency: time.sleep(self.latency)
+        if len(mosi) != 3 or not mosi[0] & 0b100: return [0] * len(mosi)  # no start bit, the chip stays idle
+        channel = ((mosi[0] & 1) << 2) | (mosi[1] >> 6)
+        with self._lock:
+            volts = self.voltage(channel) + (self.random.gauss(0, self.noise) if self.noise else 0)
+            self.transfers += 1
+        code = min(max(int(volts / self.vref * 4096), 0), 4095)
+        return [0, code >> 8, code & 0xff]
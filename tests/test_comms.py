@@ -0,0 +1,81 @@
+# Run from the repository root: python -m pytest tests
+
+import random, threading, time
+import pytest
+import codec
+import comms
+
+
+def text_packet(length):
+    packet = comms.Packet("filler", return_data="x" * length)
+    packet.set_time()
+    return packet
+
+
+def chunk_budget():
+    return comms.MAX_PACKET_SIZE - comms.RECORD_HEADER_SIZE - comms.HEADER_SIZE
+
+
+def test_append_to_queue_chunk_limit():
+    comms.transmission_queue.clear()
+    packet = text_packet(comms.MAX_CHUNKS * chunk_budget())
+    comms.append_to_queue(packet)
+    assert len(comms.transmission_queue) == comms.MAX_CHUNKS
+    comms.transmission_queue.clear()
+    with pytest.raises(ValueError):
+        comms.append_to_queue(text_packet(comms.MAX_CHUNKS * chunk_budget() + 1))
+    assert len(comms.transmission_queue) == 0
+
+
+class BlockingModem:
+    """
+    Iridium stand in whose SBDIXA waits for release, like a long session
+    """
+    def __init__(self):
+        self.release, self.sessions = threading.Event(), threading.Event()
+
+    def ring_alerts(self, enable): pass
+
+    def clear_buffers(self, buffer=2): pass
+
+    def sbd_initiate_xa(self):
+        self.sessions.set()
+        self.release.wait(5)
+        return [0, 0, 0, 0, 0, 0]
+
+
+def test_ring_callback_does_not_block(monkeypatch):
+    modem = BlockingModem()
+    monkeypatch.setattr(comms, "iridium", modem)
+    monkeypatch.setattr(comms.gpio, "on_ring", lambda callback: None)
+    monkeypatch.setattr(comms.gpio, "remove_ring_callback", lambda: None)
+    comms.enable_ring_alerts()
+    try:
+        start = time.perf_counter()
+        comms._on_ring(0)
+        assert time.perf_counter() - start < 0.1
+        assert modem.sessions.wait(5)  # the ring thread is inside the SBDIXA, the callback already returned
+    finally:
+        modem.release.set()
+        comms.disable_ring_alerts()
+    with comms.modem_lock: assert comms.mt_queued == 0
+
+
+def test_unserved_ring_forgets_mt_queued(monkeypatch):
+    monkeypatch.setattr(comms, "iridium", BlockingModem())
+    monkeypatch.setattr(comms.scheduler, "due", lambda: False)
+    comms.mt_queued = 0
+    comms._retrieve_mt()
+    assert comms.mt_queued is None
+
+
+def test_numeric_chunks_fit():
+    rng = random.Random(0)
+    for values in ([round(rng.uniform(0, 50), 2) for _ in range(2000)], [20 + i * 0.01 for i in range(2000)],
+                   [rng.gauss(0, 1e6) for _ in range(500)]):
+        packet = comms.Packet("filler", return_data=values)
+        chunks = list(comms._chunks(packet))
+        assert [c.start for c in chunks[1:]] == [c.stop for c in chunks[:-1]] and chunks[-1].stop == len(values)
+        sizes = [codec.encoded_size(c.return_data) for c in chunks]
+        assert max(sizes) <= chunk_budget()
+        assert min(sizes[:-1]) > chunk_budget() - 2 * codec.FLOAT_LEN  # full, bar the last
@@ -0,0 +1,15 @@
+# Run from the repository root: python -m pytest tests
+
+import ground
+
+
+def test_reassembler_reports_index_overflow():
+    reassembler = ground.Reassembler()
+    count = ground.INDEX_LIMIT + 18
+    for i in range(count):
+        chunk = ground.Packet("filler", i % ground.INDEX_LIMIT, 1, 2, 3, 0, [float(i)], i == count - 1)
+        assert reassembler.add(chunk) is None
+    assert reassembler.stats["overflowed"] == 1
+    assert reassembler.stats["overflow_chunks"] == 18
+    assert reassembler.stats["duplicates"] == 0
+    assert reassembler.missing()[("filler", 1, 2, 3)][2]
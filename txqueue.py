@@ -0,0 +1,111 @@
+# Transmission queue
+# Heap ordered by priority (lower goes first), then by arrival. Packets may carry a deadline after which they are
+# stale and dropped instead of sent. Removal is lazy, so push, pop and remove are all O(log n) or better
+
+import heapq, itertools, threading, time
+
+DEFAULT_PRIORITY = 5
+
+
+class TransmissionQueue:
+    def __init__(self, clock=time.monotonic, on_drop=None):
+        """
+        Safe to share between producer threads and contact()
+        :param clock: (callable) time source for deadlines, seconds
+        :param on_drop: (callable) called with each packet dropped for passing its deadline, under the queue lock
+        """
+        self.clock, self.on_drop = clock, on_drop
+        self.dropped = 0  # packets expired before they were sent
+        self._heap, self._entries, self._count = [], {}, itertools.count()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock: return len(self._entries)
+
+    def push(self, packet, priority=DEFAULT_PRIORITY, deadline=None):
+        """
+        :param packet: (Packet) packet to queue, each packet object may be queued once
+        :param priority: (int) lower is sent first
+        :param deadline: (float) clock time after which the packet is dropped, None to keep it until sent
+        """
+        entry = [priority, next(self._count), packet, deadline]
+        with self._lock:
+            if id(packet) in self._entries: raise ValueError("Packet already queued")
+            self._entries[id(packet)] = entry
+            heapq.heappush(self._heap, entry)
+
+    def peek(self):
+        """
+        :return: (Packet) next packet to send, None if the queue is empty
+        """
+        head = self.peek_many(1)
+        return head[0] if head else None
+
+    def peek_many(self, count):
+        """
+        :param count: (int) most packets to return
+        :return: (list) up to count packets in send order, left in the queue
+        """
+        with self._lock:
+            entries = []
+            while self._heap and len(entries) < count:
+                entry = self._pop_entry()
+                if entry is not None: entries.append(entry)
+            for entry in entries: heapq.heappush(self._heap, entry)
+            return [entry[2] for entry in entries]
+
+    def pop(self):
+        """
+        :return: (Packet) next packet to send, removed from the queue, None if the queue is empty
+        """
+        with self._lock:
+            while self._heap:
+                entry = self._pop_entry()
+                if entry is not None:
+                    del self._entries[id(entry[2])]
+                    return entry[2]
+            return None
+
+    def remove(self, packet):
+        """
+        Drops a packet wherever it is in the queue, eg once it has been sent
+        :param packet: (Packet) queued packet
+        :return: (bool) False if it was no longer queued, eg it expired meanwhile
+        """
+        with self._lock:
+            entry = self._entries.pop(id(packet), None)
+            if entry is None: return False
+            entry[2] = None  # left in the heap, skipped when it surfaces
+            return True
+
+    def expire(self):
+        """
+        Drops every packet past its deadline now, rather than as they reach the head of the queue
+        :return: (int) packets dropped
+        """
+        with self._lock:
+            now, dropped = self.clock(), 0
+            for entry in list(self._entries.values()):
+                if entry[3] is not None and entry[3] <= now:
+                    del self._entries[id(entry[2])]
+                    if self.on_drop is not None: self.on_drop(entry[2])
+                    entry[2], dropped = None, dropped + 1
+            self.dropped += dropped
+            return dropped
+
+    def clear(self):
+        with self._lock: self._heap, self._entries = [], {}
+
+    def _pop_entry(self):
+        """
+        Pops the heap top, discarding it if it was removed or has expired. Lock must be held
+        :return: (list) live entry, None if the top was discarded
+        """
+        entry = heapq.heappop(self._heap)
+        if entry[2] is None: return None
+        if entry[3] is not None and entry[3] <= self.clock():
+            del self._entries[id(entry[2])]
+            if self.on_drop is not None: self.on_drop(entry[2])
+            self.dropped += 1
+            return None
+        return entry